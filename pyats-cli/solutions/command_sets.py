@@ -0,0 +1,139 @@
+"""
+Command sets per device and per group of devices, used by the configuration
+and test scripts instead of a single list applied to every device.
+
+The commands of a device are, in order:
+1. The "all" command set
+2. The command set of each group listed in the device custom data
+   ("command_groups" in the testbed)
+3. The command set named after the device
+4. The "commands" list from the device custom data, if any
+
+Command sets are text files in the command set directory, named after the
+set (e.g. "command_sets/core.cfg"), written like a running configuration -
+one command per line, with child lines indented under their parent:
+
+    ip http secure-server
+    interface Loopback0
+     description Managed by pyATS
+
+Files are read line by line while the commands are sent, so no device's
+full command list needs to be held in memory.  If the directory has no
+command set for a device, the "command_list" from commands.py is used.
+
+Testbed example:
+    devices:
+      R1:
+        custom:
+          command_groups: [core, netconf]
+          commands:
+            - ip domain name example.com
+"""
+import os
+from itertools import islice
+
+# Directory holding the command set files
+COMMAND_SET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "command_sets")
+
+# Extension of the command set files
+COMMAND_SET_EXTENSION = ".cfg"
+
+# Name of the command set applied to every device
+ALL_DEVICES_SET = "all"
+
+
+def read_command_blocks(lines):
+    """
+    Group configuration lines into commands - a line and its indented child
+    lines form a single command
+
+    :param lines: Iterable of configuration lines
+    :return: Generator of command strings
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip()
+        if not line.strip() or line.lstrip().startswith("!"):
+            continue
+        if block and not line[0].isspace():
+            yield "\n".join(block)
+            block = []
+        block.append(line)
+    if block:
+        yield "\n".join(block)
+
+
+def batches(commands, size):
+    """
+    Split a stream of commands into lists of at most "size" commands
+
+    :param commands: Iterable of commands
+    :param size: Maximum number of commands per list
+    :return: Generator of lists of commands
+    """
+    commands = iter(commands)
+    while batch := list(islice(commands, size)):
+        yield batch
+
+
+class CommandSource:
+    """
+    Provides the commands of each device from the command set files and the
+    testbed custom data
+    """
+    def __init__(self, command_set_dir=COMMAND_SET_DIR):
+        """
+        Class initialization
+        :param command_set_dir:
+            Directory holding the command set files
+        """
+        self.command_set_dir = command_set_dir
+
+    def set_path(self, set_name):
+        """
+        :param set_name: Command set name - "all", a group or a device name
+        :return: Path of the command set file
+        """
+        return os.path.join(self.command_set_dir, f"{set_name}{COMMAND_SET_EXTENSION}")
+
+    def set_names(self, device):
+        """
+        :param device: pyATS device object
+        :return: List of the command set names of the device, in order
+        """
+        groups = device.custom.get("command_groups", [])
+        if isinstance(groups, str):
+            groups = [groups]
+        return [ALL_DEVICES_SET, *groups, device.name]
+
+    def read_set(self, set_name):
+        """
+        Stream the commands of a command set file
+
+        :param set_name: Command set name
+        :return: Generator of commands, empty if there is no such file
+        """
+        try:
+            with open(self.set_path(set_name), "r", encoding="utf-8") as set_file:
+                yield from read_command_blocks(set_file)
+        except FileNotFoundError:
+            return
+
+    def commands(self, device):
+        """
+        Stream the commands of a device
+
+        :param device: pyATS device object
+        :return: Generator of commands
+        """
+        set_paths = [self.set_path(set_name) for set_name in self.set_names(device)]
+        custom_commands = device.custom.get("commands", [])
+        if not any(os.path.exists(path) for path in set_paths) and not custom_commands:
+            # pylint: disable-next=import-outside-toplevel
+            from commands import command_list
+            yield from command_list
+            return
+
+        for set_name in self.set_names(device):
+            yield from self.read_set(set_name)
+        yield from custom_commands
@@ -1,17 +1,26 @@
 """
 Example script to configure devices using CLI commands with pyATS
 
-Reads the list of commands from the "command_list" variable inside the
-"commands.py" file
+Reads the commands of each device from its command sets (see
+command_sets.py), or from the "command_list" variable inside the
+"commands.py" file if the device has no command set
 
 Steps:
-1. Loop over each device in the testbed
+1. Loop over each device in the testbed - several devices at a time when
+   the "-p" option is used, adapting the number of devices to the command
+   latency and errors
 2. Connect to the device
-3. For each command in the command list:
-     - Print the command to be issued
-     - Use the pyATS configure() method to issue the CLI command
-4. Disconnect from the device
+3. Send the commands in batches, each in a single configuration session
+   with the pyATS configure() method, then record which commands the
+   device rejected.  With the "-d" option, only the commands missing from the
+   running configuration are sent.
+4. Save the running configuration if it was changed
+5. Disconnect from the device
+6. Print the output of each device, in testbed order
 """
+import re
+from argparse import ArgumentParser
+from functools import partial
 from pyats.topology import loader
 
 # NOTE: the commented "pylint" lines in scripts are used to control behavior
@@ -19,49 +28,247 @@ from pyats.topology import loader
 # possible.
 #
 # pylint: disable-next=no-name-in-module
-from unicon.core.errors import SubCommandFailure
-from commands import command_list
+from unicon.core.errors import (SubCommandFailure, ConnectionError as UniconConnectionError,
+                                TimeoutError as UniconTimeoutError)
+from command_sets import CommandSource, batches, COMMAND_SET_DIR
+from running_config import RunningConfigIndex
+
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import attach, PhaseTimer, DeviceScheduler, SnapshotStore
 
 TESTBED = "~/abc-en/pyats-testbed/testbed.yml"
 
-testbed = loader.load(TESTBED)
+# Highest number of devices configured at the same time by default (one
+# after the other)
+MAX_WORKERS = 1
+
+# Maximum number of commands sent in a single configuration session.  The
+# commands of a device are read and sent one batch at a time.
+CONFIG_BATCH_SIZE = 500
+
+# Time spent by each device in each phase (connect, configure, save...)
+timer = PhaseTimer()
+
+# Running-config snapshots of the test scripts, removed after a push so the
+# tests don't grade the configuration from before the push
+snapshots = SnapshotStore()
+
+# Error messages printed by IOS XE when a configuration command is rejected
+CONFIG_ERROR_REGEX = re.compile(r"^%\s*(Invalid|Incomplete|Ambiguous) (input|command)")
+
+# Configuration mode prompt followed by the command echoed by the device,
+# e.g. "R1(config)#ip http secure-server"
+CONFIG_ECHO_REGEX = re.compile(r"\(config[^)]*\)#\s*(?P<command>.*?)\s*$")
 
-print("-" * 78)
 
-for device_name, device in testbed.devices.items():
-    print(f"Configuring device '{device_name}'...")
+def find_failed_commands(commands, config_output):
+    """
+    Find the commands rejected by the device in the output of a configuration
+    session.  Each error message is attributed to the last command echoed by
+    the device before the message.  Commands must be echoed in the order they
+    were sent - if an echo doesn't match the next command (e.g. a mangled
+    prompt), the outcome of the following commands is unknown.
 
-    print("Connecting to device...")
-    device.connect(log_stdout=False)
+    :param commands: List of commands sent in the configuration session
+    :param config_output: Device output of the configuration session
+    :return: Tuple of (set of indexes of the rejected commands in the list,
+        number of commands from the start of the list whose outcome is
+        known).  The outcome of every command is known if the number is the
+        length of the list.
+    """
+    failed = set()
+    next_index = 0
+    current_index = None
+    for line in config_output.splitlines():
+        if echo := CONFIG_ECHO_REGEX.search(line):
+            echoed = echo.group("command")
+            if not echoed:
+                continue
+            if next_index < len(commands) and commands[next_index].strip() == echoed:
+                current_index, next_index = next_index, next_index + 1
+            elif next_index < len(commands):
+                # Out of step with the commands sent - errors can no longer
+                # be attributed
+                return failed, next_index
+            else:
+                # Command sent after the list, e.g. "end"
+                current_index = None
+        elif CONFIG_ERROR_REGEX.match(line.strip()):
+            if current_index is None:
+                return failed, next_index
+            failed.add(current_index)
+    return failed, next_index
 
-    # Send each command from the command_list to the device.
-    # For each command in the command list, issue
-    # device.configure() to send the command to the device in privileged exec
-    # configuration mode.  That's all there is to it!
-    for command in command_list:
 
-        # Print that the command is being executed without a trailing newline.
-        # By default, Python adds a newline to each print() statement.
-        # Adding end="" as a print parameter instructs Python to
-        # replace the default trailing newline with an empty string, so an
-        # "OK/FAIL" indicator can be printed on the same line after the
-        # ellipses
-        print(f"Sending command '{command}'... ", end="")
+def configure_commands(device, commands):
+    """
+    Send a list of commands in a single configuration session.  If the
+    device rejects some commands and they can't be identified from the
+    output, the commands whose outcome is unknown are sent again one at a
+    time to find them.
+
+    :param device: Connected pyATS device object
+    :param commands: List of configuration commands
+    :return: List of (command, Boolean - True if accepted) tuples
+    """
+    # An empty error_pattern makes configure() return the output even if a
+    # command is rejected, so every rejected command can be found instead
+    # of stopping at the first SubCommandFailure
+    try:
+        config_output = device.configure(commands, error_pattern=[])
+    except SubCommandFailure:
+        failed, known = set(), 0
+    else:
+        failed, known = find_failed_commands(commands, config_output)
+    results = [(command, index not in failed) for index, command in enumerate(commands[:known])]
+
+    # Only the commands not confirmed by the output are sent again
+    for command in commands[known:]:
         try:
             device.configure(command)
-
         except SubCommandFailure:  # SubCommandFailure if invalid command sent
-            # If the command is invalid and configure() fails, print FAIL for
-            # the result
-            print("FAIL")
+            results.append((command, False))
+        else:
+            results.append((command, True))
+    return results
+
+
+def configure_device(device, command_source, scheduler, diff=False):
+    """
+    Connect to a device, send each command of the device and save the
+    running configuration.  Output is collected instead of printed, so
+    several devices can be configured at the same time without mixing their
+    output.
 
+    :param device: pyATS device object
+    :param command_source: CommandSource object providing the commands
+    :param scheduler: DeviceScheduler object running the device, measuring
+        the connection and configuration latency
+    :param diff: Only send the commands missing from the running
+        configuration, and only save the configuration if it was changed
+    :return: Tuple of (Boolean - True if every command succeeded, list of
+        output lines)
+    """
+    device_name = device.name
+    output = [f"Configuring device '{device_name}'...", "Connecting to device..."]
+    try:
+        # Use the session of the session broker if one is running,
+        # otherwise connect to the device
+        with timer.phase(device_name, "connect"), scheduler.measure():
+            device = attach(device, log_stdout=False)
+    except UniconConnectionError as err:
+        output.append(f"FAIL: unable to connect to device: {err}")
+        return False, output
+
+    try:
+        if diff:
+            # Retrieve the running configuration once, to only send the
+            # commands which are not configured yet
+            with timer.phase(device_name, "parse"):
+                device_config = RunningConfigIndex.from_device(device)
+
+        # Send the commands to the device one batch at a time.
+        # device.configure() accepts a list of commands, which are all sent
+        # in the same configuration session - entering and leaving
+        # configuration mode only once per batch instead of once per command.
+        success = True
+        changed = False
+        command_count = configured_count = 0
+        for batch in batches(command_source.commands(device), CONFIG_BATCH_SIZE):
+            command_count += len(batch)
+            if diff:
+                missing = device_config.missing(batch)
+                configured_count += len(batch) - len(missing)
+                batch = missing
+
+            # Commands with child lines are sent line by line
+            commands = [line.strip() for command in batch
+                        for line in command.splitlines() if line.strip()]
+            if not commands:
+                continue
+            with timer.phase(device_name, "configure"), scheduler.measure():
+                config_results = configure_commands(device, commands)
+            snapshots.invalidate(device_name)
+            for command, accepted in config_results:
+                output.append(f"Sending command '{command}'... {'OK' if accepted else 'FAIL'}")
+                success = success and accepted
+            changed = True
+
+        if diff:
+            output.append(f"{configured_count} of {command_count} command(s) already configured")
+
+        if changed:
+            # Save the running configuration
+            with timer.phase(device_name, "save"):
+                device.api.save_running_config_configuration()
         else:
-            # The command was successfully sent, print OK as the result
-            print("OK")
+            output.append("Configuration unchanged, not saving")
+    finally:
+        output.append("Disconnecting from device...")
+        with timer.phase(device_name, "disconnect"):
+            device.disconnect()
+    return success, output
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-p",
+                        dest="max_workers",
+                        action="store",
+                        type=int,
+                        help="Highest number of devices to configure at the same time",
+                        default=MAX_WORKERS)
+    parser.add_argument("-d",
+                        dest="diff",
+                        action="store_true",
+                        help="Only send the commands missing from the running configuration")
+    parser.add_argument("-s",
+                        dest="command_set_dir",
+                        action="store",
+                        help="Directory holding the command set files",
+                        default=COMMAND_SET_DIR)
+    parser.add_argument("-r",
+                        dest="timing_file",
+                        action="store",
+                        help="Write the time spent per device and phase to this file "
+                             "(JSON if named *.json, otherwise CSV)")
+    args = parser.parse_args()
+
+    testbed = loader.load(TESTBED)
+
+    print("-" * 78)
+
+    # Each device is configured by one of the scheduler threads.  Device
+    # connections spend most of their time waiting for the device, so
+    # threads are enough to configure many devices at once.  The number of
+    # devices configured at the same time grows while the devices respond
+    # quickly, and is halved when commands are slow or connections fail or
+    # time out - rejected commands don't change it.  Results are
+    # returned in testbed order, whichever device finishes first.
+    scheduler = DeviceScheduler(max_limit=args.max_workers,
+                                overload_errors=(UniconConnectionError, UniconTimeoutError))
+    devices = list(testbed.devices.values())
+    device_results = scheduler.run(devices,
+                                   partial(configure_device,
+                                           command_source=CommandSource(args.command_set_dir),
+                                           scheduler=scheduler,
+                                           diff=args.diff))
+    results = {}
+    for device, device_result in zip(devices, device_results):
+        if isinstance(device_result, Exception):
+            device_result = (False, [f"Configuring device '{device.name}'...",
+                                     f"FAIL: {device_result}"])
+        device_success, device_output = device_result
+        print("\n".join(device_output))
+        print("-" * 78)
+        results[device.name] = device_success
 
-    # Save the running configuration
-    device.api.save_running_config_configuration()
+    failed = [device_name for device_name, success in results.items() if not success]
+    print(f"Configured {len(results) - len(failed)} of {len(results)} device(s) successfully.")
+    if failed:
+        print(f"Devices with failures: {', '.join(failed)}")
 
-    print("Disconnecting from device...")
-    device.disconnect()
     print("-" * 78)
+    timer.print_summary()
+    if args.timing_file:
+        timer.write(args.timing_file)
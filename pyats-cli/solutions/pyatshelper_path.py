@@ -0,0 +1,29 @@
+"""
+Make the shared pyATS helpers (the pyatshelper package) importable.
+Scripts import this module before importing pyatshelper:
+
+    import pyatshelper_path  # pylint: disable=unused-import
+    from pyatshelper import attach
+
+The helpers of the repository are used when the script runs from a clone
+(<repo>/<lab>/lab or solutions, helpers in <repo>/setup), so they are never
+stale.  Otherwise the copy made by the lab preparation script is used
+(~/abc-en/<lab>, helpers in ~/abc-en).
+"""
+import os
+import sys
+
+# Directories searched for the pyatshelper package, in order
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HELPER_DIRS = (
+    os.path.join(SCRIPT_DIR, os.pardir, os.pardir, "setup"),
+    os.path.join(SCRIPT_DIR, os.pardir),
+    os.path.expanduser("~/abc-en"),
+)
+
+for helper_dir in HELPER_DIRS:
+    helper_dir = os.path.normpath(helper_dir)
+    if os.path.isdir(os.path.join(helper_dir, "pyatshelper")):
+        if helper_dir not in sys.path:
+            sys.path.insert(0, helper_dir)
+        break
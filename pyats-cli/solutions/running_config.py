@@ -0,0 +1,129 @@
+"""
+Index of the running configuration of a device, used by the configuration
+and test scripts to check which commands are already configured.
+
+The running configuration is retrieved once per device and every line is
+stored with its parent sections, e.g. " description Uplink" under
+"interface GigabitEthernet1" is stored as the path
+("interface GigabitEthernet1", "description Uplink").  Checking whether a
+command is configured is then a set lookup, however many commands are
+checked.
+
+Commands may be a single line ("ip http secure-server") or a block with
+indented child lines, like in the running configuration:
+
+    interface Loopback0
+     description Managed by pyATS
+"""
+import re
+
+# Lines of the running configuration which are not configuration commands
+IGNORED_LINE_REGEX = re.compile(r"^(!|Building configuration|Current configuration|end$)")
+
+# Lines which are off by default and always shown in the running
+# configuration when configured.  Their "no ..." form is hidden, so it is
+# configured whenever the line itself is absent.  Other "no ..." lines are
+# only configured if present as such: features on by default, e.g.
+# "ip domain lookup", are not shown either way.
+DEFAULT_OFF_LINES = {"shutdown"}
+
+
+def normalize(line):
+    """
+    Normalize a configuration line - no leading, trailing or repeated spaces
+
+    :param line: Configuration line
+    :return: Normalized line
+    """
+    return " ".join(line.split())
+
+
+def config_paths(config_text):
+    """
+    Convert configuration text to the path of each line, using the
+    indentation of the lines to find their parent sections
+
+    :param config_text: Configuration text, e.g. "show running-config" output
+    :return: List of tuples - the parent sections and the line itself
+    """
+    paths = []
+    # Stack of (indentation, line) of the sections containing the current line
+    parents = []
+    for line in config_text.splitlines():
+        if not line.strip() or IGNORED_LINE_REGEX.match(line.strip()):
+            continue
+        indent = len(line) - len(line.lstrip())
+        while parents and parents[-1][0] >= indent:
+            parents.pop()
+        path = tuple(parent for _, parent in parents) + (normalize(line),)
+        paths.append(path)
+        parents.append((indent, normalize(line)))
+    return paths
+
+
+class RunningConfigIndex:
+    """
+    Set of the lines of a running configuration with their parent sections
+    """
+    def __init__(self, config_text):
+        """
+        Class initialization
+        :param config_text:
+            Output of the "show running-config" command
+        """
+        self.paths = set(config_paths(config_text))
+
+    @classmethod
+    def from_device(cls, device):
+        """
+        Retrieve the running configuration of a connected device and index it
+
+        :param device: Connected pyATS device object
+        :return: RunningConfigIndex object
+        """
+        return cls(device.execute("show running-config"))
+
+    def children(self, *parents):
+        """
+        Lines configured directly under a section
+
+        :param parents: Section lines, e.g. "interface Loopback0"
+        :return: Set of child lines
+        """
+        parents = tuple(normalize(parent) for parent in parents)
+        return {path[-1] for path in self.paths
+                if len(path) == len(parents) + 1 and path[:-1] == parents}
+
+    def has_path(self, path):
+        """
+        Check a single line, given with its parent sections
+
+        A "no ..." line is configured if present as such, or if it negates
+        one of DEFAULT_OFF_LINES and that line is absent.
+
+        :param path: Tuple of the parent sections and the line
+        :return: Boolean - True if the line is configured
+        """
+        if path in self.paths:
+            return True
+        if path[-1].startswith("no ") and path[-1][3:] in DEFAULT_OFF_LINES:
+            return path[:-1] + (path[-1][3:],) not in self.paths
+        return False
+
+    def __contains__(self, command):
+        """
+        Check a command - a single line or a block with indented child lines
+
+        :param command: Command text
+        :return: Boolean - True if every line of the command is configured
+        """
+        return all(self.has_path(path) for path in config_paths(command))
+
+    def missing(self, commands):
+        """
+        Commands which are not (completely) configured
+
+        :param commands: List of commands
+        :return: List of the commands missing from the configuration, in order
+        """
+        return [command for command in commands if command not in self]
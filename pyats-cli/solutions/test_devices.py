@@ -2,31 +2,82 @@
 Example script to test that commands are present in the running configuration
 of each device.
 
-Reads the list of commands from the "command_list" variable inside "commands.py"
+Reads the commands of each device from its command sets (see
+command_sets.py), or from the "command_list" variable inside "commands.py"
+if the device has no command set
 
 Steps:
 1. Loop over each device in the testbed
-2. Connect to the device
-3. Use a pyATS parser to get the running configuration
-4. For each command in the command list, test that the command is
-   present in the running configuration
+2. Get the running configuration and index its lines - connecting to the
+   device unless a recent snapshot of the running configuration is reused
+3. For each command of the device, test that the command is
+   present in the running configuration.  Commands may include indented
+   child lines, which are checked under their parent section.
      - If present, print a PASS statement
      - If absent, print a FAIL statement
-5. Disconnect from the device
+4. Disconnect from the device
 """
+from argparse import ArgumentParser
 from pyats.topology import loader
-from commands import command_list
+from command_sets import CommandSource, COMMAND_SET_DIR
+from running_config import RunningConfigIndex
+
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import SnapshotStore, PhaseTimer, attach
 
 # Path and name of the pyATS testbed file to load.  Python does not support
 # true constants, but variables that should be used as a constant should use
 # UPPERCASE names.
 TESTBED = "~/abc-en/pyats-testbed/testbed.yml"
 
+parser = ArgumentParser()
+parser.add_argument("-s",
+                    dest="command_set_dir",
+                    action="store",
+                    help="Directory holding the command set files",
+                    default=COMMAND_SET_DIR)
+parser.add_argument("-r",
+                    dest="timing_file",
+                    action="store",
+                    help="Write the time spent per device and phase to this file "
+                         "(JSON if named *.json, otherwise CSV)")
+args = parser.parse_args()
+
 # Load the testbed.  The pyATS "loader.load()" handles the import and parsing
 # of the YAML testbed file, without requiring additional Python packages
 # such as "yaml"
 testbed = loader.load(TESTBED)
 
+# Command output is saved under ~/abc-en/snapshots.  Set the
+# PYATS_SNAPSHOT_MAX_AGE environment variable to reuse recent snapshots
+# instead of collecting the output again.
+snapshots = SnapshotStore()
+
+# Time spent by each device in each phase (connect, parse, test...)
+timer = PhaseTimer()
+
+# Commands of each device, read from the command set files while testing
+command_source = CommandSource(args.command_set_dir)
+
+# Device sessions opened while testing, to disconnect them afterwards
+sessions = {}
+
+
+def connect_device(device):
+    """
+    Connect to a device when its running configuration must be collected.
+    attach() uses the session of the session broker if one is running,
+    otherwise it connects to the device.
+
+    :param device: pyATS device object
+    :return: Connected device object
+    """
+    print("Connecting to device...")
+    with timer.phase(device.name, "connect"):
+        sessions[device.name] = attach(device, log_stdout=False)
+    return sessions[device.name]
+
+
 # Python supports operators such as this when printing strings.  In
 # this example, print the dash (-) character 78 times to act as a
 # separator.
@@ -52,31 +103,45 @@ for device_name, device in testbed.devices.items():
     # inside single curly braces {} will be interpreted and the value printed!
     print(f"Testing running config for '{device_name}'")
 
-    # Connect to the device and suppress STDOUT
-    # By default, pyATS will display all CLI output generated during
-    # the connection and setup process, which can be a lot.  To suppress,
-    # specify log_stdout=False as a parameter to device.connect()
-    print("Connecting to device...")
-    device.connect(log_stdout=False)
-
+    # Retrieve the running configuration once and build an index of its lines
+    # (with the parent section of nested lines, e.g. under an interface).
+    # Checking whether a command is in the index is a quick set lookup, even
+    # with thousands of commands to check.
+    #
+    # Only connect to the device (with connect_device) if no recent snapshot
+    # can be reused.  By default, pyATS will display all CLI output generated
+    # during the connection and setup process, which can be a lot.  To
+    # suppress, specify log_stdout=False.
     print("Getting running configuration")
-    device_config = device.parse("show running-config")
+    with timer.phase(device_name, "parse"):
+        device_config = RunningConfigIndex(
+            snapshots.execute(device, "show running-config", connect=connect_device)
+        )
 
-    # For each command in the command_list, assert that the command is present
+    # For each command of the device, assert that the command is present
     # in the running configuration. Catch any AssertionError and print a
     # meaningful message indicating that the command is missing.
     # If no exception is caught, print a message that the command IS in the
     # running-config.
-    for command in command_list:
-        try:
-            assert command in device_config, "Test that the command exists in running-config"
-        except AssertionError:
-            print(f"FAIL: '{command}' not found in configuration.")
-        else:
-            print(f"PASS: '{command}' is in the configuration.")
+    with timer.phase(device_name, "test"):
+        for command in command_source.commands(device):
+            try:
+                assert command in device_config, "Test that the command exists in running-config"
+            except AssertionError:
+                print(f"FAIL: '{command}' not found in configuration.")
+            else:
+                print(f"PASS: '{command}' is in the configuration.")
 
     # Disconnect from the device and print a separator string before the next
     # iteration
-    print("Disconnecting from device...")
-    device.disconnect()
+    if session := sessions.pop(device_name, None):
+        print("Disconnecting from device...")
+        with timer.phase(device_name, "disconnect"):
+            session.disconnect()
     print("-" * 78)
+
+# Summarize the time spent per phase across the devices, and write the time
+# spent per device and phase if requested
+timer.print_summary()
+if args.timing_file:
+    timer.write(args.timing_file)
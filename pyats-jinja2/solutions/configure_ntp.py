@@ -2,16 +2,31 @@
 Example script to configure devices using Jinja2 templates with pyATS
 
 Steps:
-1. Loop over each device in the testbed
-2. Connect to the device
-3. Load a Jinja2 template as an object using a Genie API
-4. Configure the device using the template object, passing custom testbed
-   parameters to the Jinja2 template for rendering
+1. Render stage: load a Jinja2 template as an object - compiled once and
+   shared by all the devices - and render it for every device, passing
+   custom testbed parameters to the Jinja2 template.  The configuration of
+   each device is saved in the build directory, where it can be reviewed.
+2. Push stage: loop over each device in the testbed - several devices at a
+   time, the number of devices adapting to the command latency and errors
+3. Skip the device if its rendered configuration was already pushed
+4. Connect to the device (or use the session of the session broker) and
+   configure the device with the rendered configuration
+5. Print the output of each device, in testbed order
+
+Use "-s render" to only render the configurations, and "-s push" to push
+the configurations rendered by a previous run.
 """
+from argparse import ArgumentParser
+from functools import partial
 from pyats.topology import loader
 
 # pylint: disable-next=no-name-in-module
-from unicon.core.errors import SubCommandFailure
+from unicon.core.errors import (SubCommandFailure, ConnectionError as UniconConnectionError,
+                                TimeoutError as UniconTimeoutError)
+
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import (attach, DeviceScheduler, get_jinja_template, ArtifactStore,
+                         DEFAULT_BUILD_DIR, SnapshotStore)
 
 TESTBED = "testbed.yml"
 
@@ -20,33 +35,134 @@ TESTBED = "testbed.yml"
 TEMPLATE_DIR = "templates"
 TEMPLATE_FILE = "ntp_template.j2"
 
-testbed = loader.load(TESTBED)
+# Highest number of devices configured at the same time
+MAX_DEVICES = 5
 
-print("*" * 78)
-for device_name, device in testbed.devices.items():
-    print(f"Connecting to device '{device_name}'")
-    device.connect(log_stdout=False)
+# Name of the rendered configuration in the build directory of each device
+NTP_ARTIFACT = "ntp.cfg"
+
+# Running-config snapshots of the test scripts, removed after a push so the
+# tests don't grade the configuration from before the push
+snapshots = SnapshotStore()
 
-    device_template = device.api.get_jinja_template(
+
+def render_device(device):
+    """
+    Render the NTP configuration of a device from the Jinja2 template
+
+    :param device: pyATS device object
+    :return: Dict of artifact name to rendered configuration
+    """
+    # Same as the device.api.get_jinja_template Genie API, but the compiled
+    # template is cached instead of being compiled again for every device
+    device_template = get_jinja_template(
         templates_dir=TEMPLATE_DIR, template_name=TEMPLATE_FILE
     )
+    # Any key/value pair passed to render() is accessible inside the
+    # template for rendering.
+    return {NTP_ARTIFACT: device_template.render(
+        ntp_source=device.custom.ntp_source,
+        ntp_servers=device.custom.ntp_servers,
+    )}
+
+
+def configure_device(device, scheduler, artifacts, force=False):
+    """
+    Configure NTP on a device with its rendered configuration.  Output is
+    collected instead of printed, so several devices can be configured at
+    the same time without mixing their output.
+
+    :param device: pyATS device object
+    :param scheduler: DeviceScheduler object measuring the device latency
+    :param artifacts: ArtifactStore object holding the rendered configuration
+    :param force: Push the configuration even if it was already pushed
+    :return: Tuple of (Boolean - True if the device was configured, list of
+        output lines)
+    """
+    device_name = device.name
+    config = artifacts.read(device_name, NTP_ARTIFACT)
+    if config is None:
+        return False, [f"No rendered configuration for '{device_name}', render it first"]
+    if not force and not artifacts.changed(device_name, NTP_ARTIFACT):
+        return True, [f"Configuration of '{device_name}' unchanged since the last push, skipping"]
+
+    output = [f"Connecting to device '{device_name}'"]
+    with scheduler.measure():
+        device = attach(device, log_stdout=False)
 
     try:
-        # Other than the template parameter which specifies the
-        # template object to load, any other key/value pair will be passed
-        # to Jinja2 and accessible inside the template for rendering.
-        device.api.change_configuration_using_jinja_templates(
-            template=device_template,
-            ntp_source=device.custom.ntp_source,
-            ntp_servers=device.custom.ntp_servers,
-        )
+        # The rendered configuration is sent with configure(), like
+        # change_configuration_using_jinja_templates does, so it also works
+        # through the session broker.
+        with scheduler.measure():
+            device.configure(config)
     except SubCommandFailure as err:
-        print(f"Failed to configure device:\n{err}")
+        output.append(f"Failed to configure device:\n{err}")
+        success = False
     else:
-        print("Device configured successfully.")
+        output.append("Device configured successfully.")
         # Save the running configuration
         device.api.save_running_config_configuration()
+        artifacts.mark_pushed(device_name, NTP_ARTIFACT)
+        snapshots.invalidate(device_name)
+        success = True
+    finally:
+        output.append(f"Disconnecting from '{device_name}'")
+        device.disconnect()
+    return success, output
+
 
-    print(f"Disconnecting from '{device_name}'")
-    device.disconnect()
+parser = ArgumentParser()
+parser.add_argument("-s",
+                    dest="stage",
+                    action="store",
+                    choices=("render", "push", "all"),
+                    help="Only render the configurations, or only push the rendered configurations",
+                    default="all")
+parser.add_argument("-b",
+                    dest="build_dir",
+                    action="store",
+                    help="Directory holding the rendered configurations",
+                    default=DEFAULT_BUILD_DIR)
+parser.add_argument("-f",
+                    dest="force",
+                    action="store_true",
+                    help="Push the configurations even if they were already pushed")
+args = parser.parse_args()
+
+testbed = loader.load(TESTBED)
+artifacts = ArtifactStore(args.build_dir)
+devices = list(testbed.devices.values())
+
+print("*" * 78)
+if args.stage in ("render", "all"):
+    # Render every configuration before touching any device
+    render_results = artifacts.render(devices, render_device)
+    rendered_count = 0
+    for device_name, render_result in render_results.items():
+        if isinstance(render_result, Exception):
+            print(f"Failed to render the configuration of '{device_name}': {render_result}")
+        else:
+            rendered_count += 1
+    print(f"Rendered {rendered_count} of {len(render_results)} configuration(s) "
+          f"in '{artifacts.build_dir}'")
     print("*" * 78)
+
+if args.stage in ("push", "all"):
+    # Devices are configured by the scheduler threads, more of them at the
+    # same time while the devices respond quickly.  Results are returned in
+    # testbed order.
+    # Only connection failures and timeouts show the devices are overloaded,
+    # rejected configuration doesn't reduce the number of devices
+    scheduler = DeviceScheduler(max_limit=MAX_DEVICES,
+                                overload_errors=(UniconConnectionError, UniconTimeoutError))
+    device_results = scheduler.run(devices,
+                                   partial(configure_device, scheduler=scheduler,
+                                           artifacts=artifacts, force=args.force))
+
+    for device, device_result in zip(devices, device_results):
+        if isinstance(device_result, Exception):
+            device_result = (False,
+                             [f"Failed to configure device '{device.name}': {device_result}"])
+        print("\n".join(device_result[1]))
+        print("*" * 78)
@@ -6,11 +6,17 @@ Example:
 
 Arguments:
     --testbed-file: Path and filename of the pyATS testbed file
+    --device-tasks: (Optional) Run one task per device, in parallel
+    --shard-size: (Optional) Number of devices per task with --device-tasks
+    --max-workers: (Optional) Number of tasks running at the same time
 """
 import os
 import logging
 from pyats.easypy import run  # pylint: disable=no-name-in-module
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import task_arguments, run_device_tasks
+
 logger = logging.getLogger(__name__)
 
 # Find the location of the script in relation to the job file
@@ -36,5 +42,11 @@ def main(runtime):
     # Change the default job name to something useful
     runtime.job.name = "Test NTP configuration and operational state"
 
-    # Execute the testscript
-    run(testscript=testscript, runtime=runtime)
+    # Execute the testscript - either as a single task testing every device,
+    # or as one task per device (or shard of devices) running in parallel.
+    # Easypy merges the results of all tasks in the job report.
+    args = task_arguments()
+    if args.device_tasks:
+        run_device_tasks(testscript, runtime, args.shard_size, args.max_workers)
+    else:
+        run(testscript=testscript, runtime=runtime)
@@ -10,8 +10,41 @@ execution.
 import logging
 from pyats import aetest
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import SnapshotStore
+
 logger = logging.getLogger(__name__)
 
+# Running configurations are saved under ~/abc-en/snapshots.  Set the
+# PYATS_SNAPSHOT_MAX_AGE environment variable to reuse recent snapshots.
+snapshots = SnapshotStore()
+
+
+def get_ntp_state(running_config):
+    """
+    Get the NTP source interface and servers from a running configuration
+
+    :param running_config: Running configuration text
+    :return: Tuple of (source interface or None, list of NTP servers or None
+        if no server is configured)
+    """
+    source_interface = None
+    servers = []
+    for line in running_config.splitlines():
+        words = line.split()
+        if words[:2] == ["ntp", "source"] and len(words) > 2:
+            source_interface = words[2]
+        elif words[:2] == ["ntp", "server"]:
+            # Skip options preceding the server: "vrf <name>", "ip", "ipv6"
+            words = words[2:]
+            if words[:1] == ["vrf"]:
+                words = words[2:]
+            if words[:1] in (["ip"], ["ipv6"]):
+                words = words[1:]
+            if words:
+                servers.append(words[0])
+    return source_interface, servers or None
+
 
 class CommonSetup(aetest.CommonSetup):
     """
@@ -20,19 +53,22 @@ class CommonSetup(aetest.CommonSetup):
     """
 
     @aetest.subsection
-    def connect(self, testbed):
+    def connect(self, testbed, devices=None):
         """
-        First setup task: connect to all devices in the testbed
+        First setup task: connect to all devices in the testbed, or to the
+        devices of the current task
 
         :param testbed: Testbed object passed as a parameter from the Easypy
             job file.
+        :param devices: Device names of the current task when the job runs
+            one task per device, None for all devices
 
         :return: None (no return)
         """
-        testbed.connect(log_stdout=False)
+        testbed.connect(*(devices or []), log_stdout=False)
 
     @aetest.subsection
-    def mark_tests_for_looping(self, testbed):  # , perform_configuration):
+    def mark_tests_for_looping(self, testbed, devices=None):  # , perform_configuration):
         """
         The test will be executed against every device in the testbed, so
         define a variable named "device_name" which stores the list of
@@ -43,11 +79,13 @@ class CommonSetup(aetest.CommonSetup):
 
         :param testbed: Testbed object passed as a parameter from the Easypy
             job file.
+        :param devices: Device names of the current task when the job runs
+            one task per device, None for all devices
 
         :return: None (no return)
         """
 
-        aetest.loop.mark(TestNTP, device_name=testbed.devices)
+        aetest.loop.mark(TestNTP, device_name=devices or list(testbed.devices))
 
 
 class TestNTP(aetest.Testcase):
@@ -57,6 +95,8 @@ class TestNTP(aetest.Testcase):
     """
 
     device = None
+    ntp_source = None
+    ntp_servers = None
 
     @aetest.setup
     def setup(self, testbed, device_name):
@@ -65,6 +105,9 @@ class TestNTP(aetest.Testcase):
             - Set the object attribute 'device' which is accessible throughout
               this test as "self.device" and is a reference to the pyATS
               testbed device object.
+            - Get the NTP source interface and servers from the running
+              configuration once (or a recent snapshot), for every test of
+              the device.
 
         :param testbed: Easypy-passed testbed object
         :param device_name: Current device as loop-marked by CommonSetup
@@ -74,6 +117,12 @@ class TestNTP(aetest.Testcase):
         # Set the 'device' parameter for all tests
         self.device = testbed.devices[device_name]
 
+        # The tests and each NTP server iteration check this state instead
+        # of sending the same show commands to the device again
+        self.ntp_source, self.ntp_servers = get_ntp_state(
+            snapshots.execute(self.device, "show running-config")
+        )
+
         aetest.loop.mark(self.test_ntp_servers,
                          ntp_server=self.device.custom.ntp_servers)
 
@@ -87,12 +136,12 @@ class TestNTP(aetest.Testcase):
         """
 
         desired_source_interface = self.device.custom.ntp_source
-        configured_source_interface = self.device.api.get_ntp_source_interface_ip()
+        configured_source_interface = self.ntp_source
 
         # Observe that a simple pass/fail result will be generated based on
         # the test of the desired state (from the testbed) to the configured
-        # state based on the output of the device get_ntp_source_interface_ip()
-        # API. In this scenario, the self.failed or self.passed state is set
+        # state from the running configuration retrieved during setup.  In
+        # this scenario, the self.failed or self.passed state is set
         # to indicate pass/fail status of this test.
         try:
             assert desired_source_interface in configured_source_interface, \
@@ -120,7 +169,7 @@ class TestNTP(aetest.Testcase):
         """
 
         try:
-            assert ntp_server in self.device.api.get_ntp_servers()
+            assert ntp_server in self.ntp_servers
         except TypeError:
             self.failed("No NTP servers defined in the running configuration")
         except AssertionError:
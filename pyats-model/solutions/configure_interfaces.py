@@ -4,32 +4,82 @@ interfaces based on definitions in the testbed file.
 
 Attributes of interfaces which may be configured are accessible inside the
 interface "for" loop using dir(interface).  Any attribute listed that is
-specified in the testbed and assigned a value will be applied to the device,
-assuming "apply=True" is passed to build_config.
+specified in the testbed and assigned a value is included in the
+configuration built by build_config, which is then sent to the device.
+
+Several devices are configured at the same time, the number of devices
+adapting to the command latency and errors.
 """
+from functools import partial
 from pyats.topology import loader
 
+# pylint: disable-next=no-name-in-module
+from unicon.core.errors import (ConnectionError as UniconConnectionError,
+                                TimeoutError as UniconTimeoutError)
+
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import attach, DeviceScheduler, SnapshotStore
+
 TESTBED = "testbed.yml"
 
 # Should the running-config be saved after configuration?
 SAVE_CONFIG = True
 
-testbed = loader.load(TESTBED)
+# Highest number of devices configured at the same time
+MAX_DEVICES = 5
 
-print("*" * 78)
-for device_name, device in testbed.devices.items():
-    print(f"Connecting to device '{device_name}'")
-    device.connect(log_stdout=False)
+# Running-config snapshots of the test scripts, removed after a push so the
+# tests don't grade the configuration from before the push
+snapshots = SnapshotStore()
+
+
+def configure_device(device, scheduler):
+    """
+    Configure the interfaces of a device.  Output is collected instead of
+    printed, so several devices can be configured at the same time without
+    mixing their output.
 
-    for interface_name, interface in device.interfaces.items():
-        print(f"\tConfiguring interface {interface_name}")
+    :param device: pyATS device object
+    :param scheduler: DeviceScheduler object measuring the device latency
+    :return: List of output lines
+    """
+    device_name = device.name
+    output = [f"Connecting to device '{device_name}'"]
+    with scheduler.measure():
+        session = attach(device, log_stdout=False)
 
-        interface.build_config(apply=True)
+    try:
+        for interface_name, interface in device.interfaces.items():
+            output.append(f"\tConfiguring interface {interface_name}")
 
-    # Save the running config
-    if SAVE_CONFIG:
-        device.api.save_running_config_configuration()
+            # Build the interface configuration without applying it, then send
+            # it on the device session (which may be held by the session broker)
+            with scheduler.measure():
+                session.configure(str(interface.build_config(apply=False)))
+            snapshots.invalidate(device_name)
 
-    print(f"Disconnecting from '{device_name}'")
-    device.disconnect()
+        # Save the running config
+        if SAVE_CONFIG:
+            session.api.save_running_config_configuration()
+    finally:
+        output.append(f"Disconnecting from '{device_name}'")
+        session.disconnect()
+    return output
+
+
+testbed = loader.load(TESTBED)
+
+# Devices are configured by the scheduler threads, more of them at the same
+# time while the devices respond quickly.  Results are returned in testbed
+# order.  Only connection failures and timeouts reduce the number of devices.
+scheduler = DeviceScheduler(max_limit=MAX_DEVICES,
+                            overload_errors=(UniconConnectionError, UniconTimeoutError))
+devices = list(testbed.devices.values())
+device_results = scheduler.run(devices, partial(configure_device, scheduler=scheduler))
+
+print("*" * 78)
+for device, device_output in zip(devices, device_results):
+    if isinstance(device_output, Exception):
+        device_output = [f"Failed to configure device '{device.name}': {device_output}"]
+    print("\n".join(device_output))
     print("*" * 78)
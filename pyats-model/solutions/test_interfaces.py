@@ -10,9 +10,16 @@ execution.
 import logging
 from pyats import aetest
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import SnapshotStore, config_section
+
 # Initialize logging
 logger = logging.getLogger(__name__)
 
+# Running configurations are saved under ~/abc-en/snapshots.  Set the
+# PYATS_SNAPSHOT_MAX_AGE environment variable to reuse recent snapshots.
+snapshots = SnapshotStore()
+
 # If no shutdown state defined for an interface, set a default
 # False = "no shutdown"
 # True = "shutdown"
@@ -33,18 +40,21 @@ class CommonSetup(aetest.CommonSetup):
     """
 
     @aetest.subsection
-    def connect(self, testbed):
+    def connect(self, testbed, devices=None):
         """
-        First setup task: connect to all devices in the testbed
+        First setup task: connect to all devices in the testbed, or to the
+        devices of the current task
 
         :param testbed: Testbed object passed as a parameter from the Easypy
         job file.
+        :param devices: Device names of the current task when the job runs
+        one task per device, None for all devices
         :return: None (no return defined)
         """
-        testbed.connect(log_stdout=False)
+        testbed.connect(*(devices or []), log_stdout=False)
 
     @aetest.subsection
-    def mark_tests_for_looping(self, testbed):
+    def mark_tests_for_looping(self, testbed, devices=None):
         """
         The test will be executed against every device in the testbed, so
         define a variable named "device_name" which stores the list of
@@ -55,9 +65,11 @@ class CommonSetup(aetest.CommonSetup):
 
         :param testbed: Testbed object passed as a parameter from the Easypy
         job file.
+        :param devices: Device names of the current task when the job runs
+        one task per device, None for all devices
         :return: None (no return defined)
         """
-        aetest.loop.mark(TestInterfaces, device_name=testbed.devices)
+        aetest.loop.mark(TestInterfaces, device_name=devices or list(testbed.devices))
 
 
 class TestInterfaces(aetest.Testcase):
@@ -72,12 +84,17 @@ class TestInterfaces(aetest.Testcase):
     # or repeating "device = testbed.devices[device_name]" in each test.
     device = None
 
+    # Running configuration of the device, retrieved once during setup
+    running_config = None
+
     @aetest.setup
     def setup(self, testbed, device_name):
         """
         Initial setup tasks for this Testcase.  Tasks performed:
             - Initialize the object attribute "device" as a reference to the
               testbed device object for the current host.
+            - Retrieve the running configuration once (or reuse a recent
+              snapshot) for the interface tests.
             - Mark the "test_interface" method for looping where method
               parameter "interface_name" will represent the currently
               iterated interface's name.
@@ -88,6 +105,7 @@ class TestInterfaces(aetest.Testcase):
         :return: None (no return)
         """
         self.device = testbed.devices[device_name]
+        self.running_config = snapshots.execute(self.device, "show running-config")
 
         # Mark test_interface_state test to loop device interface names
         aetest.loop.mark(
@@ -119,15 +137,12 @@ class TestInterfaces(aetest.Testcase):
         # Set the current interface object for easy access in the test
         current_interface = self.device.interfaces[interface_name]
 
-        # Grab the running config dict for this interface then remove the key
-        # so only the interface config lines exist.  Useful for tests where no
-        # API currently exists.
-        current_interface_config = self.device.api.get_interface_running_config(
-            interface=current_interface.name
+        # Grab the running config lines for this interface from the running
+        # config retrieved during setup.  Useful for tests where no API
+        # currently exists.
+        current_interface_config = config_section(
+            self.running_config, f"interface {current_interface.name}"
         )
-        current_interface_config = current_interface_config[
-            f"interface {current_interface.name}"
-        ]
 
         # Test 1: Check the admin state.
         with steps.start("Admin state (shutdown)", continue_=True) as step:
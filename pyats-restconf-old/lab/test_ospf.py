@@ -11,9 +11,16 @@ import logging
 import re
 from pyats import aetest
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import SnapshotStore, config_section
+
 # Initialize logging
 logger = logging.getLogger(__name__)
 
+# Running configurations are saved under ~/abc-en/snapshots.  Set the
+# PYATS_SNAPSHOT_MAX_AGE environment variable to reuse recent snapshots.
+snapshots = SnapshotStore()
+
 ALL_LOOPBACKS = [
     "172.20.100.10",
     "172.20.100.11",
@@ -31,7 +38,7 @@ class CommonSetup(aetest.CommonSetup):
     """
 
     @aetest.subsection
-    def mark_tests_for_looping(self, testbed):
+    def mark_tests_for_looping(self, testbed, devices=None):
         """
         The test will be executed against every device in the testbed, so
         define a variable named "device_name" which stores the list of
@@ -42,9 +49,11 @@ class CommonSetup(aetest.CommonSetup):
 
         :param testbed: Testbed object passed as a parameter from the Easypy
         job file.
+        :param devices: Device names of the current task when the job runs
+        one task per device, None for all devices
         :return: None (no return defined)
         """
-        aetest.loop.mark(TestOspf, device_name=testbed.devices)
+        aetest.loop.mark(TestOspf, device_name=devices or list(testbed.devices))
 
 
 class TestOspf(aetest.Testcase):
@@ -59,12 +68,17 @@ class TestOspf(aetest.Testcase):
     # or repeating "device = testbed.devices[device_name]" in each test.
     device = None
 
+    # Running configuration of the device, retrieved once during setup
+    running_config = None
+
     @aetest.setup
     def setup(self, testbed, device_name):
         """
         Initial setup tasks for this Testcase.  Tasks performed:
             - Initialize the object attribute "device" as a reference to the
               testbed device object for the current host.
+            - Retrieve the running configuration once (or reuse a recent
+              snapshot) for the OSPF process and interface tests.
             - Mark the "test_interface_ospf" method for looping where method
               parameter "interface_name" will represent the currently
               iterated interface's name.
@@ -76,6 +90,7 @@ class TestOspf(aetest.Testcase):
         """
         self.device = testbed.devices[device_name]
         self.device.connect(log_stdout=False, via="cli")
+        self.running_config = snapshots.execute(self.device, "show running-config")
 
         aetest.loop.mark(
             self.test_interface_ospf, interface_name=self.device.interfaces.keys()
@@ -99,12 +114,11 @@ class TestOspf(aetest.Testcase):
 
         :return: None (no return)
         """
-        # Get the OSPF process running config.  Strip the first dict key which
-        # will be "router ospf (process)" so the config dict only contains
-        # config lines for the OSPF process.
-        ospf_config = self.device.api.get_router_ospf_section_running_config(
-            ospf_process_id=self.device.custom.ospf["process_id"])
-        ospf_config = ospf_config[f"router ospf {self.device.custom.ospf['process_id']}"]
+        # Get the OSPF process config lines, under "router ospf (process)" in
+        # the running config retrieved during setup.
+        ospf_config = config_section(
+            self.running_config, f"router ospf {self.device.custom.ospf['process_id']}"
+        )
 
         # Check the router ID
         with steps.start("Router-ID matches Loopback0 IP") as step:
@@ -167,14 +181,11 @@ class TestOspf(aetest.Testcase):
 
         current_interface = self.device.interfaces[interface_name]
 
-        # Get the current interface config and strip the first key from the
-        # output to give a dict with only the interface config.
-        current_interface_config = self.device.api.get_interface_running_config(
-            interface=current_interface.name
+        # Get the current interface config lines from the running config
+        # retrieved during setup.
+        current_interface_config = config_section(
+            self.running_config, f"interface {current_interface.name}"
         )
-        current_interface_config = current_interface_config[
-            f"interface {current_interface.name}"
-        ]
 
         with steps.start("OSPF Process and Area") as step:
             try:
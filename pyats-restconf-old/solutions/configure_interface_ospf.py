@@ -1,79 +1,206 @@
 """
-Docstring
+Configure OSPF on the interfaces of each device with RESTCONF, using
+Jinja2 templates for the payloads.
+
+The payloads of every device are rendered first and saved in the build
+directory, where they can be reviewed.  They are then pushed to the
+devices, skipping the payloads already pushed.  Several devices are
+configured at the same time, the number of devices adapting to the
+RESTCONF latency and errors.
+
+Use "-s render" to only render the payloads, and "-s push" to push the
+payloads rendered by a previous run.
 """
 import re
-from requests.exceptions import RequestException
+from argparse import ArgumentParser
+from functools import partial
+from requests.exceptions import (RequestException, ConnectionError as RequestsConnectionError,
+                                 Timeout)
 from pyats.topology import loader
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import (DeviceScheduler, load_jinja_template, ArtifactStore, artifact_name,
+                         DEFAULT_BUILD_DIR, SnapshotStore)
+
 TEMPLATE_PATH = "./templates"
 TESTBED = "testbed.yml"
 
 NATIVE_MODEL = "Cisco-IOS-XE-native:native"
 OSPF_MODEL = "Cisco-IOS-XE-ospf:router-ospf"
 
-testbed = loader.load(TESTBED)
+# Highest number of devices configured at the same time
+MAX_DEVICES = 5
 
-interface_regex = re.compile(r"^(\D+)(.*)$")
+# Running-config snapshots of the test scripts, removed after a push so the
+# tests don't grade the configuration from before the push
+snapshots = SnapshotStore()
 
-print("*" * 78)
-for device_name, device in testbed.devices.items():
-    print(f"Connecting to device '{device_name}'")
-    device.connect(via="rest")
+interface_regex = re.compile(r"^(\D+)(.*)$")
 
-    for interface_name, interface in device.interfaces.items():
-        print(f"\tConfiguring OSPF on interface {interface_name}")
+# Payloads rendered for each interface: (artifact name suffix, description,
+# template file, URL suffix, function returning the template variables of an
+# interface)
+OSPF_PAYLOADS = (
+    ("area.json", "process and area", "interface_ospf_area.j2", "",
+     lambda interface: {"ospf_process": interface.ospf_process,
+                        "interface_area": interface.ospf_area}),
+    ("network.json", "network type", "interface_ospf_network.j2", "/network",
+     lambda interface: {"ospf_network_type": interface.ospf_network_type}),
+)
 
-        parsed_interface_name = interface_regex.match(interface_name)
-        interface_type, interface_index = parsed_interface_name.groups()
 
-        url = f"/restconf/data/{NATIVE_MODEL}/interface/" \
-              f"{interface_type}={interface_index}/ip/{OSPF_MODEL}/ospf"
+def render_device(device):
+    """
+    Render the RESTCONF payloads of each interface of a device
 
-        try:
-            rest_payload = device.api.load_jinja_template(
+    :param device: pyATS device object
+    :return: Dict of artifact name to payload
+    """
+    payloads = {}
+    for interface_name, interface in device.interfaces.items():
+        for suffix, _, template_file, _, template_vars in OSPF_PAYLOADS:
+            try:
+                variables = template_vars(interface)
+            except AttributeError:
+                # Nothing to configure if the interface has no OSPF settings
+                continue
+            # Same as the device.api.load_jinja_template Genie API, but the
+            # compiled templates are cached instead of being compiled again
+            # for every interface
+            payloads[artifact_name(interface_name, suffix)] = load_jinja_template(
                 path=TEMPLATE_PATH,
-                file="interface_ospf_area.j2",
-                ospf_process=interface.ospf_process,
-                interface_area=interface.ospf_area,
+                file=template_file,
+                **variables,
             )
+    return payloads
+
 
-            print("\t\tConfiguring OSPF process and area...", end="")
+def put_payload(device, scheduler, url, payload):
+    """
+    PUT a payload to a RESTCONF URL
+
+    :param device: Connected pyATS device object
+    :param scheduler: DeviceScheduler object measuring the device latency
+    :param url: RESTCONF URL
+    :param payload: Rendered payload
+    :return: Tuple of (Boolean - True if successful, string describing the
+        result)
+    """
+    try:
+        with scheduler.measure():
             config_result = device.rest.put(
                 api_url=url,
-                payload=rest_payload,
+                payload=payload,
                 content_type="application/yang-data+json",
             )
+    except RequestException as err:
+        return False, f"FAILED: Error details:\n\t\t\t{err}"
+    return True, f"SUCCESS: {config_result.status_code} ({config_result.reason})"
 
-        except AttributeError as err:
-            print("\t\tSKIPPED: No OSPF area defined for interface.")
-        except RequestException as err:
-            print(
-                print(f"FAILED: Error details:\n\t\t\t{err}")
-            )
-        else:
-            print(f"SUCCESS: {config_result.status_code} ({config_result.reason})")
 
-        try:
-            url = f"{url}/network"
+def configure_device(device, scheduler, artifacts, force=False):
+    """
+    Configure OSPF on the interfaces of a device with the rendered payloads.
+    Output is collected instead of printed, so several devices can be
+    configured at the same time without mixing their output.
 
-            rest_payload = device.api.load_jinja_template(
-                path=TEMPLATE_PATH,
-                file="interface_ospf_network.j2",
-                ospf_network_type=interface.ospf_network_type,
-            )
+    :param device: pyATS device object
+    :param scheduler: DeviceScheduler object measuring the device latency
+    :param artifacts: ArtifactStore object holding the rendered payloads
+    :param force: Push the payloads even if they were already pushed
+    :return: List of output lines
+    """
+    device_name = device.name
+    if device_name not in artifacts.manifest:
+        return [f"No rendered payloads for '{device_name}', render them first"]
+    rendered = artifacts.artifacts(device_name)
+    if not rendered:
+        return [f"No OSPF payloads defined for '{device_name}', nothing to push"]
+    if not force and not any(artifacts.changed(device_name, name) for name in rendered):
+        return [f"Payloads of '{device_name}' unchanged since the last push, skipping"]
 
-            print("\t\tConfiguring OSPF network type...", end="")
-            config_result = device.rest.put(
-                api_url=url,
-                payload=rest_payload,
-                content_type="application/yang-data+json",
-            )
-        except AttributeError as err:
-            print("\t\tSKIPPED: No OSPF network type defined for interface.")
-        except RequestException as err:
-            print(f"FAILED: Error details:\n\t\t\t{err}")
-        else:
-            print(f"SUCCESS: {config_result.status_code} ({config_result.reason})")
+    output = [f"Connecting to device '{device_name}'"]
+    with scheduler.measure():
+        device.connect(via="rest")
+
+    try:
+        for interface_name in device.interfaces:
+            output.append(f"\tConfiguring OSPF on interface {interface_name}")
+
+            parsed_interface_name = interface_regex.match(interface_name)
+            interface_type, interface_index = parsed_interface_name.groups()
+
+            url = f"/restconf/data/{NATIVE_MODEL}/interface/" \
+                  f"{interface_type}={interface_index}/ip/{OSPF_MODEL}/ospf"
+
+            for suffix, description, _, url_suffix, _ in OSPF_PAYLOADS:
+                name = artifact_name(interface_name, suffix)
+                if name not in rendered:
+                    output.append(f"\t\tSKIPPED: No OSPF {description} defined for interface.")
+                elif not force and not artifacts.changed(device_name, name):
+                    output.append(f"\t\tSKIPPED: OSPF {description} unchanged since the last push.")
+                else:
+                    success, result = put_payload(device, scheduler, f"{url}{url_suffix}",
+                                                  artifacts.read(device_name, name))
+                    output.append(f"\t\tConfiguring OSPF {description}...{result}")
+                    if success:
+                        artifacts.mark_pushed(device_name, name)
+                        snapshots.invalidate(device_name)
+    finally:
+        device.disconnect()
+    return output
 
-    device.disconnect()
+
+parser = ArgumentParser()
+parser.add_argument("-s",
+                    dest="stage",
+                    action="store",
+                    choices=("render", "push", "all"),
+                    help="Only render the payloads, or only push the rendered payloads",
+                    default="all")
+parser.add_argument("-b",
+                    dest="build_dir",
+                    action="store",
+                    help="Directory holding the rendered payloads",
+                    default=DEFAULT_BUILD_DIR)
+parser.add_argument("-f",
+                    dest="force",
+                    action="store_true",
+                    help="Push the payloads even if they were already pushed")
+args = parser.parse_args()
+
+testbed = loader.load(TESTBED)
+artifacts = ArtifactStore(args.build_dir)
+devices = list(testbed.devices.values())
+
+print("*" * 78)
+if args.stage in ("render", "all"):
+    # Render every payload before touching any device
+    render_results = artifacts.render(devices, render_device)
+    rendered_count = 0
+    for device_name, render_result in render_results.items():
+        if isinstance(render_result, Exception):
+            print(f"Failed to render the payloads of '{device_name}': {render_result}")
+        else:
+            rendered_count += 1
+    print(f"Rendered the payloads of {rendered_count} of {len(render_results)} device(s) "
+          f"in '{artifacts.build_dir}'")
     print("*" * 78)
+
+if args.stage in ("push", "all"):
+    # Devices are configured by the scheduler threads, more of them at the
+    # same time while the devices respond quickly.  Results are returned in
+    # testbed order.
+    # Only connection failures and timeouts show the devices are overloaded,
+    # rejected payloads don't reduce the number of devices
+    scheduler = DeviceScheduler(max_limit=MAX_DEVICES,
+                                overload_errors=(RequestsConnectionError, Timeout))
+    device_results = scheduler.run(devices,
+                                   partial(configure_device, scheduler=scheduler,
+                                           artifacts=artifacts, force=args.force))
+
+    for device, device_output in zip(devices, device_results):
+        if isinstance(device_output, Exception):
+            device_output = [f"Failed to configure device '{device.name}': {device_output}"]
+        print("\n".join(device_output))
+        print("*" * 78)
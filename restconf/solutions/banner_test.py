@@ -24,13 +24,14 @@ class CommonSetup(aetest.CommonSetup):
     """
 
     @aetest.subsection
-    def mark_tests_for_looping(self, testbed):
+    def mark_tests_for_looping(self, testbed, devices=None):
         """
         The test will be executed against every device in the testbed, so
         define a variable named "device_name" which stores the list of
-        devices from the testbed.
+        devices from the testbed (or the devices of the current task when
+        the job runs one task per device).
         """
-        aetest.loop.mark(TestBanner, device_name=testbed.devices)
+        aetest.loop.mark(TestBanner, device_name=devices or list(testbed.devices))
 
 
 class TestBanner(aetest.Testcase):
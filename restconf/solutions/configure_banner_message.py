@@ -3,37 +3,71 @@ Script to automate changing the banner message of IOS XE device.
 
 Reads file "banner.txt" into variable "banner", which is then
 updated on the device using RESTCONF put method.
-'''
 
+The payload of each device is saved in the build directory first, and
+devices which already have the same payload from a previous run are
+skipped (use "-f" to push it anyway).
+'''
+from argparse import ArgumentParser
 from pyats.topology import loader
 from requests.exceptions import RequestException
 
+import pyatshelper_path  # pylint: disable=unused-import
+from pyatshelper import load_jinja_template, ArtifactStore, SnapshotStore
+
 TEMPLATE_PATH = "./templates"
 TESTBED = "testbed.yml"
 BANNER_TEXT_FILE = "banner.txt"
 
+# Name of the rendered payload in the build directory of each device
+BANNER_ARTIFACT = "banner.json"
+
+# Running-config snapshots of the test scripts, removed after a push so the
+# tests don't grade the configuration from before the push
+snapshots = SnapshotStore()
+
+parser = ArgumentParser()
+parser.add_argument("-f",
+                    dest="force",
+                    action="store_true",
+                    help="Push the banner even if it was already pushed")
+args = parser.parse_args()
+
 # Open the banner text file and save the text into banner
 with open(BANNER_TEXT_FILE, "r", encoding="utf-8") as file:
     banner = file.read()
 
 print(f"Banner to be configured:\n{banner}")
 
+# Load the Jinja2 template and replace the variable
+# banner message with the text saved from the text
+# file.  The payload is the same for every device, so
+# it is only rendered once.
+rest_payload = load_jinja_template(
+        path=TEMPLATE_PATH,
+        file="banner_message.j2",
+        banner_message=banner,
+        )
+
 testbed = loader.load(TESTBED)
 
+# Save the payload of each device, to compare it with the payload last
+# pushed to the device
+artifacts = ArtifactStore()
+artifacts.render(testbed.devices.values(),
+                 lambda device: {BANNER_ARTIFACT: rest_payload})
+
 print("*" * 78)
 # Loop through each of the device in the testbed
 for device_name, device in testbed.devices.items():
+    if not args.force and not artifacts.changed(device_name, BANNER_ARTIFACT):
+        print(f"Banner of '{device_name}' unchanged since the last push, skipping")
+        print("*" * 78)
+        continue
+
     print(f"Connecting to device '{device_name}'")
     device.connect(via="rest")
 
-    # Load the Jinja2 template and replace the variable
-    # banner message with the text saved from the text
-    # file.
-    rest_payload = device.api.load_jinja_template(
-            path=TEMPLATE_PATH,
-            file="banner_message.j2",
-            banner_message=banner,
-            )
     try:
         print("Configuring banner...", end=" ")
         API_URL = "/restconf/data/Cisco-IOS-XE-native:native/banner/login/banner"
@@ -47,5 +81,7 @@ for device_name, device in testbed.devices.items():
         print(f"FAILED: Error details:\n\t\t\t{err}")
     else:
         print(f"SUCCESS: {config_result.status_code} ({config_result.reason})")
+        artifacts.mark_pushed(device_name, BANNER_ARTIFACT)
+        snapshots.invalidate(device_name)
     device.disconnect()
     print("*" * 78)
@@ -1,4 +1,17 @@
 """
 Define available imports from this package
 """
-from .apihelper import http_exceptions, init_http_session, BearerAuth, close_http_session
+from .apihelper import (http_exceptions, init_http_session, BearerAuth, close_http_session,
+                        HTTP_EXCEPTIONS)
+from .asynchelper import AsyncHTTPSession, init_async_http_session, close_async_http_session
+from .tokencache import TokenCache, RefreshingBearerAuth
+from .cml import cml_authenticate, init_cml_session
+from .cmlindex import LabIndex, NodeIndex, title_pattern
+from .polling import backoff_delays, deadline_after, poll_until
+from .readiness import (load_testbed_addresses, tcp_reachable, wait_for_lab_ready,
+                        READINESS_PORTS, READINESS_TIMEOUT)
+from .metrics import RequestMetrics
+from .responsecache import ResponseCache, NO_CACHE
+from .resilience import CircuitOpenError, CircuitBreaker, CircuitBreakerRegistry, RetryBudget
+from .cmlclient import CMLClient, CMLConnectionError, RESTART_TIMEOUT
+from .fleet import run_fleet, print_fleet_summary, FLEET_CONCURRENCY
@@ -6,47 +6,89 @@ script.
 Previous incarnation was class-based, this extracts relevant methods
 and is function-based to just return objects when necessary...
 """
+from inspect import iscoroutinefunction
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from urllib.parse import urlparse
 from requests_toolbelt import sessions
 import urllib3.exceptions
+from .resilience import (BudgetedRetry, RetryBudget, CircuitBreakerRegistry,
+                         CIRCUIT_FAILURE_STATUSES)
+from .responsecache import ResponseCache, RESPONSE_CACHE_TTL
 
 # Default request timeout
 REQUEST_TIMEOUT = 5
 
 
+def display_http_exception(err):
+    """
+    Print a message describing a common HTTP exception type.  Shared by the
+    synchronous and asyncio variants of the http_exceptions decorator.
+
+    :param err: Exception instance caught by the decorator
+    :return: None (no return)
+    """
+    if isinstance(err, requests.exceptions.HTTPError):
+        print(f"Http Error: {err}")
+    elif isinstance(err, requests.exceptions.ConnectionError):
+        print(f"Error Connecting: {err}")
+    elif isinstance(err, requests.exceptions.Timeout):
+        print(f"Timeout Error: {err}")
+    elif isinstance(err, requests.exceptions.RequestException):
+        print(f"Generic Request Exception: {err}")
+    elif isinstance(err, requests.exceptions.RequestsWarning):
+        print(f"HTTP: Request warning encountered: {err}")
+    elif isinstance(err, urllib3.exceptions.MaxRetryError):
+        print(f"HTTP: Max retries reached, request failed: {err}")
+
+
+# Exception types handled by the http_exceptions decorator
+HTTP_EXCEPTIONS = (
+    requests.exceptions.RequestException,
+    requests.exceptions.RequestsWarning,
+    urllib3.exceptions.MaxRetryError,
+)
+
+
 # Decorator function to catch HTTP exceptions
 def http_exceptions(func):
     """
     Used as a wrapper to raise an HTTP request for status and catch/display
-    common error types
+    common error types.  Coroutine functions (async def) are wrapped with an
+    async wrapper so helpers using the asyncio session can be decorated too.
 
     :param func: Function to wrap inside this decorator
     :return: Executed function result
     """
+    if iscoroutinefunction(func):
+        async def async_wrapper(*args, **kwargs):
+            # Set a result first so it's not eaten in the event of exception
+            wrapper_result = False
+            try:
+                wrapper_result = await func(*args, **kwargs)
+            except HTTP_EXCEPTIONS as err:
+                display_http_exception(err)
+            return wrapper_result
+        return async_wrapper
+
     def wrapper(*args, **kwargs):
         # Set a result first so it's not eaten in the event of exception
         wrapper_result = False
         try:
             wrapper_result = func(*args, **kwargs)
-        except requests.exceptions.HTTPError as err:
-            print(f"Http Error: {err}")
-        except requests.exceptions.ConnectionError as err:
-            print(f"Error Connecting: {err}")
-        except requests.exceptions.Timeout as err:
-            print(f"Timeout Error: {err}")
-        except requests.exceptions.RequestException as err:
-            print(f"Generic Request Exception: {err}")
-        except requests.exceptions.RequestsWarning as err:
-            print(f"HTTP: Request warning encountered: {err}")
-        except urllib3.exceptions.MaxRetryError as err:
-            print(f"HTTP: Max retries reached, request failed: {err}")
+        except HTTP_EXCEPTIONS as err:
+            display_http_exception(err)
         return wrapper_result
     return wrapper
 
 
-default_retry_strategy = Retry(
+# Retry budget and per-host circuit breakers shared by every session created
+# by init_http_session, so concurrent callers do not multiply the load on an
+# overloaded server
+default_retry_budget = RetryBudget()
+default_circuit_breakers = CircuitBreakerRegistry()
+
+default_retry_strategy = BudgetedRetry(
     total=3,
     redirect=16,
     backoff_factor=0.3,
@@ -54,7 +96,9 @@ default_retry_strategy = Retry(
     allowed_methods=[
         "HEAD", "GET", "PUT", "POST", "PATCH", "DELETE", "OPTIONS", "TRACE"
     ],
-    respect_retry_after_header=True
+    respect_retry_after_header=True,
+    budget=default_retry_budget,
+    circuit_breakers=default_circuit_breakers
 )
 
 
@@ -94,22 +138,70 @@ class TimeoutHTTPAdapter(HTTPAdapter):
     objects.  When used for a session, set the timeout to the value of
     REQUEST_TIMEOUT by default.  This will be overridden if the
     'timeout' argument is supplied.
+
+    If a CircuitBreakerRegistry is supplied with the 'circuit_breakers'
+    argument, requests to a host whose circuit is open fail immediately and
+    Retry-After deferrals of the host are honored before sending.
+
+    If a ResponseCache is supplied with the 'response_cache' argument,
+    identical GET requests are coalesced and answered from the cache, and
+    modifying requests invalidate the cached responses of the resource.
     """
     def __init__(self, *args, **kwargs):
         self.timeout = REQUEST_TIMEOUT
         if "timeout" in kwargs:
             self.timeout = kwargs["timeout"]
             del kwargs["timeout"]
+        self.circuit_breakers = kwargs.pop("circuit_breakers", None)
+        self.response_cache = kwargs.pop("response_cache", None)
         super().__init__(*args, **kwargs)
 
     def send(self, request, *args, **kwargs):
         timeout = kwargs.get('timeout')
         if timeout is None:
             kwargs["timeout"] = self.timeout
-        return super().send(request, *args, **kwargs)
+        if self.response_cache is None or kwargs.get("stream"):
+            return self._send(request, *args, **kwargs)
+
+        def send_and_load():
+            response = self._send(request, *args, **kwargs)
+            # Load the content now, so the response can be shared
+            _ = response.content
+            return response
+
+        return self.response_cache.send(request, send_and_load)
+
+    def _send(self, request, *args, **kwargs):
+        if self.circuit_breakers is None:
+            return super().send(request, *args, **kwargs)
+
+        host = urlparse(request.url).hostname
+        breaker = self.circuit_breakers.get(host)
+        trial = breaker.before_request(host)
+        try:
+            if budget := getattr(self.max_retries, "budget", None):
+                budget.deposit()
+
+            try:
+                response = super().send(request, *args, **kwargs)
+            except requests.exceptions.RequestException:
+                breaker.record_failure()
+                raise
+            if response.status_code in CIRCUIT_FAILURE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+        finally:
+            # Any other exception would leave the circuit half-open,
+            # rejecting every request to the host
+            if trial:
+                breaker.end_trial()
 
 
-def init_http_session(baseurl=None, auth=None):
+# pylint: disable-next=too-many-arguments
+def init_http_session(baseurl=None, auth=None, pool_maxsize=None, metrics=None,
+                      cache_ttl=RESPONSE_CACHE_TTL):
     """
     Create an HTTP session object - either BaseUrl if specified or a generic
     session if the baseurl is not provided.  The advantage of an HTTP session
@@ -124,6 +216,14 @@ def init_http_session(baseurl=None, auth=None):
         and subsequent requests may be made with relative paths
     :param auth: (Optional) Reference to a requests.auth.AuthBase object to
         initialize authentication for the requests session
+    :param pool_maxsize: (Optional) Maximum number of connections kept open
+        per host.  Set this when the session is shared between threads so
+        concurrent requests do not discard pooled connections.
+    :param metrics: (Optional) RequestMetrics object recording the latency,
+        retries, status code and size of every response of the session
+    :param cache_ttl: (Optional) Seconds GET responses are reused, identical
+        concurrent GETs being coalesced into one request.  Set to 0 to
+        disable the response cache.
 
     :return: Python requests Session object which can be used to perform
         requests by the calling script
@@ -137,11 +237,25 @@ def init_http_session(baseurl=None, auth=None):
     else:
         http_session = requests.Session()
 
-    http_session.mount("https://", TimeoutHTTPAdapter(max_retries=default_retry_strategy))
-    http_session.mount("http://", TimeoutHTTPAdapter(max_retries=default_retry_strategy))
+    adapter_kwargs = {
+        "max_retries": default_retry_strategy,
+        "circuit_breakers": default_circuit_breakers,
+    }
+    if pool_maxsize:
+        adapter_kwargs["pool_maxsize"] = pool_maxsize
+    # A single cache for both adapters, so it is shared by the whole session
+    if cache_ttl:
+        adapter_kwargs["response_cache"] = ResponseCache(ttl=cache_ttl)
+
+    http_session.mount("https://", TimeoutHTTPAdapter(**adapter_kwargs))
+    http_session.mount("http://", TimeoutHTTPAdapter(**adapter_kwargs))
 
     http_session.hooks['response'] = [http_assert_status_hook]
 
+    # Record metrics before the status hook raises for error responses
+    if metrics is not None:
+        http_session.hooks['response'].insert(0, metrics.response_hook)
+
     if auth:
         http_session.auth = auth
 
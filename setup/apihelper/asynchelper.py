@@ -0,0 +1,125 @@
+"""
+Asyncio API helper - wraps the requests Session objects created by
+init_http_session so many requests can be issued concurrently from
+coroutines while keeping the same retry, timeout and bearer authentication
+behavior.
+
+Requests are executed in a bounded thread pool whose size matches the
+connection pool of the underlying session, so no more than max_connections
+requests are in flight against the host at any time.  The blocking session
+remains available as the "session" attribute, which lets existing
+http_exceptions-decorated helpers keep working unchanged.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from .apihelper import init_http_session, close_http_session
+
+# Default number of concurrent requests / pooled connections per host
+DEFAULT_MAX_CONNECTIONS = 10
+
+
+class AsyncHTTPSession:
+    """
+    Asyncio facade for a requests Session object.  Each request coroutine
+    runs the blocking session call in a bounded thread pool.
+    """
+    def __init__(self, http_session, max_connections=DEFAULT_MAX_CONNECTIONS):
+        """
+        Class initialization
+        :param http_session:
+            Requests Session object (usually created by init_http_session)
+            used to perform the requests
+        :param max_connections:
+            Maximum number of requests executed concurrently
+        """
+        self.session = http_session
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_connections,
+                                            thread_name_prefix="apihelper")
+
+    async def request(self, method, url, **kwargs):
+        """
+        Perform an HTTP request without blocking the event loop
+
+        :param method: HTTP method, e.g. "GET" or "PUT"
+        :param url: URL (relative if the session is a BaseUrlSession)
+        :param kwargs: Any other keyword argument accepted by requests
+        :return: requests Response object
+        """
+        loop = asyncio.get_running_loop()
+        call = partial(self.session.request, method, url, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def get(self, url, **kwargs):
+        """
+        Perform an HTTP GET request
+        """
+        return await self.request("GET", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        """
+        Perform an HTTP PUT request
+        """
+        return await self.request("PUT", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """
+        Perform an HTTP POST request
+        """
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        """
+        Perform an HTTP DELETE request
+        """
+        return await self.request("DELETE", url, **kwargs)
+
+    def run(self, coroutine):
+        """
+        Synchronous facade - run a coroutine to completion from blocking code
+        and return its result.  Must not be called from a running event loop.
+
+        :param coroutine: Coroutine object to execute
+        :return: Result of the coroutine
+        """
+        return asyncio.run(coroutine)
+
+    def close(self):
+        """
+        Stop the worker threads and close the underlying HTTP session
+
+        :return: None (no return)
+        """
+        self._executor.shutdown(wait=True)
+        close_http_session(self.session)
+
+
+def init_async_http_session(baseurl=None, auth=None,
+                            max_connections=DEFAULT_MAX_CONNECTIONS, metrics=None):
+    """
+    Create an asyncio HTTP session object.  The underlying requests session
+    is created with init_http_session, so the same retry strategy, timeout
+    and status hooks apply, with a connection pool sized to max_connections.
+
+    :param baseurl: (Optional) If specified, relative URLs may be used
+    :param auth: (Optional) Reference to a requests.auth.AuthBase object
+    :param max_connections: (Optional) Maximum concurrent requests
+    :param metrics: (Optional) RequestMetrics object recording every response
+
+    :return: AsyncHTTPSession object
+    """
+    http_session = init_http_session(baseurl=baseurl, auth=auth,
+                                     pool_maxsize=max_connections, metrics=metrics)
+    return AsyncHTTPSession(http_session, max_connections=max_connections)
+
+
+def close_async_http_session(async_session):
+    """
+    Close the asyncio HTTP session
+
+    :param async_session: AsyncHTTPSession object reference to close
+
+    :return: None (no return)
+    """
+    async_session.close()
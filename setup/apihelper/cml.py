@@ -0,0 +1,93 @@
+"""
+Cisco Modeling Labs (CML) helper functions shared by the setup scripts.
+"""
+import requests
+from .apihelper import init_http_session
+from .asynchelper import DEFAULT_MAX_CONNECTIONS
+from .tokencache import TokenCache, RefreshingBearerAuth
+
+# Generic application/json headers
+CML_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+# Authentication attempts before giving up
+AUTH_MAX_RETRIES = 5
+
+
+def cml_authenticate(base_url, auth_payload, verify=True, max_retries=AUTH_MAX_RETRIES):
+    """
+    Authenticate to CML and return a bearer token.  Retry until max_retries
+    is hit.
+
+    :param base_url: Base URL of the CML instance, e.g. https://198.18.134.1
+    :param auth_payload: Dict with "username" and "password" keys
+    :param verify: TLS certificate verification (False for self-signed)
+    :param max_retries: Number of attempts before giving up
+
+    :return: Token string, or None if authentication failed
+    """
+    cml_auth_url = f"{base_url}/api/v0/authenticate"
+    for attempt in range(1, max_retries):
+        try:
+            print(f"Attempting to authenticate to CML at {base_url} (attempt #{attempt})...")
+            auth_response = requests.post(url=cml_auth_url,
+                                          json=auth_payload,
+                                          headers=CML_HEADERS,
+                                          verify=verify,
+                                          timeout=5)
+            auth_response.raise_for_status()
+            return auth_response.json()
+        # pylint: disable-next=broad-except
+        except Exception as err:  # Catch any exception, not worried about specifics
+            print(f"Exception encountered during authentication.  Details:\n{err}")
+    return None
+
+
+def init_cml_session(base_url, auth_payload, verify=True, token_cache=None,
+                     pool_maxsize=DEFAULT_MAX_CONNECTIONS, metrics=None):
+    """
+    Create an HTTP session for the CML API using a cached token when one is
+    still valid, otherwise authenticate and cache the new token.  If CML
+    rejects the token (HTTP 401), the session re-authenticates transparently
+    and updates the cache.
+
+    :param base_url: Base URL of the CML instance
+    :param auth_payload: Dict with "username" and "password" keys
+    :param verify: TLS certificate verification (False for self-signed)
+    :param token_cache: (Optional) TokenCache object; the default on-disk
+        cache is used if not provided
+    :param pool_maxsize: (Optional) Connection pool size, which should match
+        the max_connections of any AsyncHTTPSession wrapping this session
+    :param metrics: (Optional) RequestMetrics object recording every response
+
+    :return: Requests BaseUrlSession object, or None if authentication failed
+    """
+    username = auth_payload["username"]
+    if token_cache is None:
+        token_cache = TokenCache()
+
+    def refresh():
+        token = cml_authenticate(base_url, auth_payload, verify=verify)
+        if token:
+            token_cache.set(base_url, username, token)
+        else:
+            token_cache.invalidate(base_url, username)
+        return token
+
+    if token := token_cache.get(base_url, username):
+        print(f"Using cached CML token for {username}@{base_url}")
+    elif not (token := refresh()):
+        return None
+
+    print("Initializing the HTTP session...")
+    http_session = init_http_session(baseurl=base_url,
+                                     auth=RefreshingBearerAuth(token=token, refresh=refresh),
+                                     pool_maxsize=pool_maxsize, metrics=metrics)
+    http_session.verify = verify
+    http_session.headers.update(CML_HEADERS)
+    # CML users see different labs, cached indexes are kept per user
+    http_session.cml_username = username
+
+    return http_session
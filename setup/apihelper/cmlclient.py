@@ -0,0 +1,415 @@
+"""
+CML API client composing the apihelper building blocks - token cache,
+asyncio session, lab/node indexes, backoff polling and readiness checks.
+
+The connection is established lazily: creating a CMLClient performs no
+network request, authentication happens on the first API call (or an
+explicit connect()), so scripts and tools can import and compose it freely.
+"""
+import asyncio
+from time import perf_counter
+import requests
+from .apihelper import http_exceptions, HTTP_EXCEPTIONS
+from .asynchelper import AsyncHTTPSession, DEFAULT_MAX_CONNECTIONS
+from .cml import init_cml_session
+from .cmlindex import LabIndex, NodeIndex
+from .fleet import run_fleet, FLEET_CONCURRENCY
+from .responsecache import NO_CACHE
+from .polling import deadline_after, poll_until
+from .readiness import (load_testbed_addresses, wait_for_lab_ready, READINESS_TIMEOUT,
+                        READINESS_PORTS)
+
+# Seconds allowed for nodes to stop and start again
+RESTART_TIMEOUT = 600
+
+
+class CMLConnectionError(requests.exceptions.ConnectionError):
+    """
+    Raised when the client is unable to authenticate to CML
+    """
+
+
+class CMLClient:
+    """
+    Client for the CML API with lazy connection establishment
+    """
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, base_url, auth_payload, verify=True,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, token_cache=None, metrics=None):
+        """
+        Class initialization - no connection is made until it is needed
+        :param base_url:
+            Base URL of the CML instance, e.g. https://198.18.134.1
+        :param auth_payload:
+            Dict with "username" and "password" keys
+        :param verify:
+            TLS certificate verification (False for self-signed)
+        :param max_connections:
+            Maximum number of concurrent requests
+        :param token_cache:
+            (Optional) TokenCache object, the default on-disk cache otherwise
+        :param metrics:
+            (Optional) RequestMetrics object recording every response
+        """
+        self.base_url = base_url
+        self.auth_payload = auth_payload
+        self.verify = verify
+        self.max_connections = max_connections
+        self.token_cache = token_cache
+        self.metrics = metrics
+        self._async_session = None
+
+    def connect(self):
+        """
+        Authenticate (reusing a cached token when still valid) and create the
+        HTTP session, unless already connected
+
+        :return: Boolean indicating success (True) or failure (False)
+        """
+        if self._async_session is None:
+            http_session = init_cml_session(self.base_url, self.auth_payload,
+                                            verify=self.verify,
+                                            token_cache=self.token_cache,
+                                            pool_maxsize=self.max_connections,
+                                            metrics=self.metrics)
+            if http_session:
+                self._async_session = AsyncHTTPSession(http_session,
+                                                       max_connections=self.max_connections)
+        return self._async_session is not None
+
+    @property
+    def async_session(self):
+        """
+        AsyncHTTPSession for the CML API, connecting on first use
+        """
+        if not self.connect():
+            raise CMLConnectionError(f"Unable to authenticate to CML at {self.base_url}")
+        return self._async_session
+
+    @property
+    def http_session(self):
+        """
+        Blocking requests session for the CML API, connecting on first use
+        """
+        return self.async_session.session
+
+    def close(self):
+        """
+        Close the HTTP session if it was established
+
+        :return: None (no return)
+        """
+        if self._async_session is not None:
+            self._async_session.close()
+            self._async_session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @http_exceptions
+    def get_labs(self):
+        """
+        Get all labs from the CML instance.
+
+        :return: JSON response containing a list of lab IDs
+        """
+        url = "/api/v0/labs"
+        print("Retrieving available labs from CML...")
+        lab_response = self.http_session.get(url=url)
+        return lab_response.json()
+
+    @http_exceptions
+    def find_lab(self, title_pattern):
+        """
+        Locate a lab by title using the cached lab index
+
+        :param title_pattern: Title substring or regular expression to match
+        :return: ID of the first matching lab, or None if no lab matches
+        """
+        async_session = self.async_session
+        return async_session.run(LabIndex(async_session).find_one(title_pattern))
+
+    @http_exceptions
+    def find_labs(self, title_patterns):
+        """
+        Locate every lab whose title matches any of the patterns
+
+        :param title_patterns: Iterable of title substrings or regular expressions
+        :return: List of (lab ID, lab title) tuples, sorted by title
+        """
+        async_session = self.async_session
+
+        async def find_all():
+            lab_index = LabIndex(async_session)
+            matches = {}
+            for title_pattern in title_patterns:
+                matches.update(await lab_index.find(title_pattern))
+            return sorted(matches.items(), key=lambda lab: lab[1])
+
+        return async_session.run(find_all())
+
+    @http_exceptions
+    def get_lab_details(self, lab_id):
+        """
+        Get the details of a specific lab
+
+        :param lab_id: ID of the lab to retrieve
+        :return: JSON response containing the lab details
+        """
+        url = f"/api/v0/labs/{lab_id}"
+        print(f"Retrieving details for lab with ID '{lab_id}' from CML...")
+        lab_response = self.http_session.get(url=url)
+        return lab_response.json()
+
+    @http_exceptions
+    def start_lab(self, lab_id):
+        """
+        Send a start request for the specified lab
+
+        :param lab_id: ID of the lab to start
+        :return: HTTP response of the start request
+        """
+        url = f"/api/v0/labs/{lab_id}/start"
+        print(f"Starting CML topology with ID '{lab_id}'...")
+        lab_response = self.http_session.put(url=url)
+        return lab_response
+
+    async def start_lab_async(self, lab_id):
+        """
+        Send a start request for the specified lab
+
+        :param lab_id: ID of the lab to start
+        :return: Boolean indicating success (True) or failure (False)
+        """
+        print(f"Starting CML topology with ID '{lab_id}'...")
+        lab_response = await self.async_session.put(url=f"/api/v0/labs/{lab_id}/start")
+        return lab_response.ok
+
+    @http_exceptions
+    def start_labs(self, labs, wait=False, timeout=READINESS_TIMEOUT,
+                   max_concurrency=FLEET_CONCURRENCY):
+        """
+        Start several labs concurrently
+
+        :param labs: List of (lab ID, lab title) tuples
+        :param wait: Also wait until every node of each lab has booted
+        :param timeout: Seconds allowed per lab for the nodes to boot
+        :param max_concurrency: Maximum number of labs handled concurrently
+        :return: Dict of lab ID to (lab title, success boolean, seconds taken)
+        """
+        async def start_pod(lab_id):
+            if not await self.start_lab_async(lab_id):
+                return False
+            return not wait or await self.wait_for_nodes_async(lab_id, timeout=timeout)
+
+        return self.async_session.run(run_fleet(labs, start_pod, max_concurrency))
+
+    @http_exceptions
+    def get_lab_nodes(self, lab_id):
+        """
+        Get all nodes from a CML lab.
+
+        :return: JSON response containing a list of node IDs
+        """
+        url = f"/api/v0/labs/{lab_id}/nodes"
+        print(f"Retrieving all nodes from lab with ID '{lab_id}'...")
+        lab_response = self.http_session.get(url=url)
+        return lab_response.json()
+
+    @http_exceptions
+    def get_node_details(self, lab_id, node_id):
+        """
+        Get details for a specific CML node.
+
+        :return: JSON response containing node details
+        """
+        url = f"/api/v0/labs/{lab_id}/nodes/{node_id}"
+        lab_response = self.http_session.get(url=url)
+        return lab_response.json()
+
+    @http_exceptions
+    def find_node(self, lab_id, node_label):
+        """
+        Locate a node by label using the cached node index of the lab
+
+        :param lab_id: ID of the lab containing the node
+        :param node_label: Label of the node (case-insensitive)
+        :return: ID of the node, or None if no node has this label
+        """
+        async_session = self.async_session
+        return async_session.run(NodeIndex(async_session, lab_id).find(node_label))
+
+    @http_exceptions
+    def find_all_nodes(self, lab_id):
+        """
+        Get all nodes of a lab using the cached node index of the lab
+
+        :param lab_id: ID of the lab
+        :return: Dict of lowercase node label to node ID
+        """
+        async_session = self.async_session
+        return async_session.run(NodeIndex(async_session, lab_id).nodes())
+
+    async def get_node_state(self, lab_id, node_id):
+        """
+        Get the state of a CML node, e.g. "STOPPED" or "STARTED".
+
+        :return: Node state string
+        """
+        url = f"/api/v0/labs/{lab_id}/nodes/{node_id}/state"
+        state_response = await self.async_session.get(url=url, headers=NO_CACHE)
+        return state_response.json()["state"]
+
+    async def restart_node_async(self, lab_id, node_id, deadline):
+        """
+        Stop a CML node, wait for it to stop, then start it and wait for it to
+        start.  State is polled with exponential backoff until the deadline.
+
+        :return: Boolean indicating success (True) or failure (False)
+        """
+        state_url = f"/api/v0/labs/{lab_id}/nodes/{node_id}/state"
+
+        async def node_in_state(*states):
+            return await self.get_node_state(lab_id, node_id) in states
+
+        await self.async_session.put(url=f"{state_url}/stop")
+        if not await poll_until(lambda: node_in_state("STOPPED"), deadline):
+            return False
+
+        await self.async_session.put(url=f"{state_url}/start")
+        return bool(await poll_until(lambda: node_in_state("STARTED", "BOOTED"), deadline))
+
+    async def restart_nodes_async(self, lab_id, node_ids, deadline):
+        """
+        Restart several CML nodes concurrently.
+
+        :param lab_id: ID of the lab containing the nodes
+        :param node_ids: List of node IDs to restart
+        :param deadline: Deadline from deadline_after() for all nodes
+        :return: Dict of node ID to (success boolean, seconds taken)
+        """
+        async def restart(node_id):
+            start_time = perf_counter()
+            try:
+                result = await self.restart_node_async(lab_id, node_id, deadline)
+            except HTTP_EXCEPTIONS as err:
+                print(f"Node {node_id}: {err}")
+                result = False
+            return node_id, (result, perf_counter() - start_time)
+
+        print(f"Restarting {len(node_ids)} node(s)...")
+        return dict(await asyncio.gather(*(restart(node_id) for node_id in node_ids)))
+
+    @http_exceptions
+    def restart_nodes(self, lab_id, node_ids, timeout=RESTART_TIMEOUT):
+        """
+        Restart several CML nodes concurrently.
+
+        :param lab_id: ID of the lab containing the nodes
+        :param node_ids: Iterable of node IDs to restart
+        :param timeout: Seconds allowed for all nodes to stop and start again
+        :return: Dict of node ID to (success boolean, seconds taken)
+        """
+        async def restart_all():
+            return await self.restart_nodes_async(lab_id, list(node_ids), deadline_after(timeout))
+
+        return self.async_session.run(restart_all())
+
+    @http_exceptions
+    # pylint: disable-next=too-many-arguments
+    def restart_labs(self, labs, node_labels=None, wait=False, timeout=RESTART_TIMEOUT,
+                     max_concurrency=FLEET_CONCURRENCY):
+        """
+        Restart nodes in several labs concurrently
+
+        :param labs: List of (lab ID, lab title) tuples
+        :param node_labels: (Optional) Labels of the nodes to restart in each
+            lab, every node of the lab otherwise
+        :param wait: Also wait until the restarted nodes have booted
+        :param timeout: Seconds allowed per lab for the nodes to stop and start
+            again, and for them to boot when waiting
+        :param max_concurrency: Maximum number of labs handled concurrently
+        :return: Dict of lab ID to (lab title, success boolean, seconds taken)
+        """
+        async def restart_pod(lab_id):
+            nodes = await NodeIndex(self.async_session, lab_id).nodes()
+            labels = [label.lower() for label in node_labels] if node_labels else list(nodes)
+            if missing := [label for label in labels if label not in nodes]:
+                print(f"No node labeled {', '.join(map(repr, missing))} found in lab '{lab_id}'.")
+                return False
+            restarted = await self.restart_nodes_async(lab_id, [nodes[label] for label in labels],
+                                                       deadline_after(timeout))
+            if not all(result for result, _ in restarted.values()):
+                return False
+            return not wait or await self.wait_for_nodes_async(lab_id, labels, timeout=timeout)
+
+        return self.async_session.run(run_fleet(labs, restart_pod, max_concurrency))
+
+    def restart_node(self, lab_id, node_id, timeout=RESTART_TIMEOUT):
+        """
+        Restart a CML node.
+
+        :return: Boolean indicating success (True) or failure (False)
+        """
+        restart_result = self.restart_nodes(lab_id, [node_id], timeout=timeout)
+        return bool(restart_result) and restart_result[node_id][0]
+
+    async def wait_for_nodes_async(self, lab_id, node_labels=None, timeout=READINESS_TIMEOUT):
+        """
+        Wait until nodes have booted in CML.  Unlike wait_for_devices, no
+        management address is probed, so no testbed is needed for the lab.
+
+        :param lab_id: ID of the lab containing the nodes
+        :param node_labels: (Optional) Only wait for these nodes
+        :param timeout: Seconds allowed for all nodes to boot
+        :return: Boolean indicating all nodes have booted (True) or not (False)
+        """
+        if node_labels is None:
+            node_labels = await NodeIndex(self.async_session, lab_id).nodes()
+        ready = await wait_for_lab_ready(self.async_session, lab_id,
+                                         dict.fromkeys(node_labels), timeout=timeout)
+        return all(elapsed is not None for elapsed in ready.values())
+
+    @http_exceptions
+    def wait_for_devices(self, lab_id, testbed_file, device_names=None,
+                         timeout=READINESS_TIMEOUT, ports=READINESS_PORTS):
+        """
+        Wait until devices have booted and accept connections on their
+        management address from the pyATS testbed.  Devices without an
+        address in the testbed (or all devices if the testbed can't be read)
+        are only waited for until they have booted.
+
+        :param lab_id: ID of the lab containing the devices
+        :param testbed_file: Path of the pyATS testbed YAML file
+        :param device_names: (Optional) Only wait for these devices
+        :param timeout: Seconds allowed for all devices to become ready
+        :param ports: TCP ports which must accept connections
+        :return: Boolean indicating all devices are ready (True) or not (False)
+        """
+        async_session = self.async_session
+        try:
+            addresses = load_testbed_addresses(testbed_file, device_names)
+        except OSError as err:
+            print(f"Unable to read testbed '{testbed_file}' ({err}), "
+                  "only waiting for the nodes to boot")
+            addresses = {}
+        if device_names is None and not addresses:
+            device_names = async_session.run(NodeIndex(async_session, lab_id).nodes())
+        for device_name in device_names or []:
+            if device_name.lower() not in {name.lower() for name in addresses}:
+                addresses[device_name] = None
+
+        unprobed = [name for name, address in addresses.items() if address is None]
+        print(f"Waiting for {len(addresses)} device(s) to become reachable...")
+        if unprobed:
+            print(f"No management address in the testbed for {', '.join(unprobed)}, "
+                  "waiting for boot only")
+        ready = async_session.run(wait_for_lab_ready(async_session, lab_id, addresses,
+                                                     ports=ports, timeout=timeout))
+        for device_name, elapsed in ready.items():
+            if elapsed is None:
+                print(f"Device '{device_name}' not reachable after {timeout}s")
+        return all(elapsed is not None for elapsed in ready.values())
@@ -0,0 +1,263 @@
+"""
+Index objects resolving CML labs by title and nodes by label with as few API
+round trips as possible.  Lookups are coroutines to be used with an
+AsyncHTTPSession.
+"""
+import asyncio
+import os
+import re
+import time
+from argparse import ArgumentTypeError
+import requests
+from .tokencache import load_json_file, save_json_file
+
+# Location of the on-disk index cache; override with the CML_INDEX_CACHE
+# environment variable
+DEFAULT_INDEX_CACHE = os.environ.get(
+    "CML_INDEX_CACHE", os.path.expanduser("~/.cache/cml_index.json")
+)
+
+# Seconds a cached lab index remains valid
+LAB_INDEX_TTL = 120
+
+# Seconds a cached node index remains valid.  Node labels rarely change, and
+# a lookup miss triggers a refresh anyway.
+NODE_INDEX_TTL = 600
+
+
+def title_pattern(pattern):
+    """
+    argparse type checking a lab title pattern, so an invalid regular
+    expression is reported as a usage error
+
+    :param pattern: Regular expression or plain title substring
+    :return: The pattern, unchanged
+    :raises: ArgumentTypeError if the pattern is not a valid regular expression
+    """
+    try:
+        re.compile(pattern)
+    except re.error as err:
+        raise ArgumentTypeError(f"invalid regular expression '{pattern}': {err}") from err
+    return pattern
+
+
+class CachedIndex:
+    """
+    Base class for an index fetched from CML and cached in memory and on disk
+    for a limited time.  Subclasses implement fetch() and cache_key.
+    """
+    def __init__(self, async_session, ttl, cache_path=DEFAULT_INDEX_CACHE):
+        """
+        Class initialization
+        :param async_session:
+            AsyncHTTPSession for the CML API (BaseUrlSession based)
+        :param ttl:
+            Seconds the index is reused before being refreshed
+        :param cache_path:
+            Path of the JSON cache file, or None to only cache in memory
+        """
+        self.async_session = async_session
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self._entries = None
+        self._expires = 0
+        # True once the index has been fetched from CML by this object
+        self.refreshed = False
+
+    @property
+    def cache_scope(self):
+        """
+        User and CML instance of the index, like the token cache keys.  CML
+        users see different labs, so indexes are never shared between users.
+        """
+        session = self.async_session.session
+        return f"{getattr(session, 'cml_username', None)}@{session.base_url}"
+
+    @property
+    def cache_key(self):
+        """
+        Key identifying this index in the on-disk cache
+        """
+        raise NotImplementedError
+
+    async def fetch(self):
+        """
+        Retrieve the index content from CML
+
+        :return: Dict to be cached
+        """
+        raise NotImplementedError
+
+    def _write_cache(self, entry):
+        entries = load_json_file(self.cache_path)
+        if entry is None:
+            if entries.pop(self.cache_key, None) is None:
+                return
+        else:
+            entries[self.cache_key] = entry
+        try:
+            save_json_file(self.cache_path, entries)
+        except OSError as err:
+            print(f"Unable to write index cache {self.cache_path}: {err}")
+
+    async def refresh(self):
+        """
+        Rebuild the index from CML
+
+        :return: Index content
+        """
+        self._entries = await self.fetch()
+        self.refreshed = True
+        self._expires = time.time() + self.ttl
+        if self.cache_path:
+            self._write_cache({"entries": self._entries, "expires": self._expires})
+        return self._entries
+
+    def invalidate(self):
+        """
+        Discard the cached index so the next lookup refreshes it
+
+        :return: None (no return)
+        """
+        self._entries = None
+        self._expires = 0
+        if self.cache_path:
+            self._write_cache(None)
+
+    async def entries(self):
+        """
+        Return the index, refreshing it if the cached copy has expired
+
+        :return: Index content
+        """
+        if self._entries is None and self.cache_path:
+            if entry := load_json_file(self.cache_path).get(self.cache_key):
+                self._entries, self._expires = entry["entries"], entry["expires"]
+        if self._entries is None or self._expires < time.time():
+            return await self.refresh()
+        return self._entries
+
+
+class LabIndex(CachedIndex):
+    """
+    Lab ID to lab title index for a CML instance.  Titles are collected with
+    the bulk "populate_lab_tiles" endpoint when available, otherwise lab
+    details are retrieved concurrently.
+    """
+    def __init__(self, async_session, ttl=LAB_INDEX_TTL, cache_path=DEFAULT_INDEX_CACHE):
+        super().__init__(async_session, ttl, cache_path)
+
+    @property
+    def cache_key(self):
+        return f"labs/{self.cache_scope}"
+
+    async def _fetch_lab_tiles(self):
+        lab_response = await self.async_session.get("/api/v0/populate_lab_tiles")
+        return {lab_id: tile["lab_title"]
+                for lab_id, tile in lab_response.json()["lab_tiles"].items()}
+
+    async def _fetch_lab_details(self):
+        lab_response = await self.async_session.get("/api/v0/labs")
+        lab_ids = lab_response.json()
+        responses = await asyncio.gather(
+            *(self.async_session.get(f"/api/v0/labs/{lab_id}") for lab_id in lab_ids)
+        )
+        return {lab_id: lab_details.json()["lab_title"]
+                for lab_id, lab_details in zip(lab_ids, responses)}
+
+    async def fetch(self):
+        print("Retrieving available labs from CML...")
+        try:
+            return await self._fetch_lab_tiles()
+        except (requests.exceptions.HTTPError, KeyError, ValueError):
+            # Bulk endpoint not available on this CML version
+            return await self._fetch_lab_details()
+
+    async def labs(self):
+        """
+        :return: Dict of lab ID to lab title
+        """
+        return await self.entries()
+
+    async def find(self, pattern):
+        """
+        Find labs whose title matches a regular expression (case-insensitive)
+
+        :param pattern: Regular expression or plain title substring.  A
+            pattern which is not a valid regular expression is matched as
+            plain text.
+        :return: List of (lab ID, lab title) tuples, sorted by title
+        """
+        try:
+            title_regex = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            title_regex = re.compile(re.escape(pattern), re.IGNORECASE)
+        labs = await self.labs()
+        return sorted(((lab_id, title) for lab_id, title in labs.items()
+                       if title and title_regex.search(title)),
+                      key=lambda lab: lab[1])
+
+    async def find_one(self, pattern):
+        """
+        Find the first lab whose title matches a regular expression
+
+        :param pattern: Regular expression or plain title substring
+        :return: Lab ID, or None if no lab matches
+        """
+        matches = await self.find(pattern)
+        return matches[0][0] if matches else None
+
+
+class NodeIndex(CachedIndex):
+    """
+    Node label to node ID index for a CML lab.  Nodes are collected with a
+    single "nodes?data=true" request when supported, otherwise node details
+    are retrieved concurrently.  Labels are matched case-insensitively.
+    """
+    def __init__(self, async_session, lab_id, ttl=NODE_INDEX_TTL, cache_path=DEFAULT_INDEX_CACHE):
+        super().__init__(async_session, ttl, cache_path)
+        self.lab_id = lab_id
+
+    @property
+    def cache_key(self):
+        return f"nodes/{self.lab_id}/{self.cache_scope}"
+
+    @staticmethod
+    def _label(node):
+        # Older CML releases nest the label inside "data"
+        return node.get("label") or node.get("data", {}).get("label")
+
+    async def fetch(self):
+        print(f"Retrieving all nodes from lab with ID '{self.lab_id}'...")
+        url = f"/api/v0/labs/{self.lab_id}/nodes"
+        node_response = await self.async_session.get(url, params={"data": "true"})
+        nodes = node_response.json()
+        if nodes and isinstance(nodes[0], dict):
+            node_labels = {node["id"]: self._label(node) for node in nodes}
+        else:
+            # Only node IDs returned, get the details concurrently
+            responses = await asyncio.gather(
+                *(self.async_session.get(f"{url}/{node_id}") for node_id in nodes)
+            )
+            node_labels = {node_id: self._label(node_details.json())
+                           for node_id, node_details in zip(nodes, responses)}
+        return {label.lower(): node_id for node_id, label in node_labels.items() if label}
+
+    async def nodes(self):
+        """
+        :return: Dict of lowercase node label to node ID
+        """
+        return await self.entries()
+
+    async def find(self, label):
+        """
+        Find a node by label.  If the label is unknown, the index is refreshed
+        once in case the node was added since it was cached.
+
+        :param label: Node label (case-insensitive)
+        :return: Node ID, or None if no node has this label
+        """
+        nodes = await self.nodes()
+        if label.lower() not in nodes and not self.refreshed:
+            nodes = await self.refresh()
+        return nodes.get(label.lower())
@@ -0,0 +1,53 @@
+"""
+Fleet helpers - run the same operation against many CML labs (one pod per
+attendee) concurrently, with a cap on the number of pods handled at once,
+and summarize the outcome and duration for every pod.
+"""
+import asyncio
+from time import perf_counter
+from .apihelper import HTTP_EXCEPTIONS
+
+# Default number of pods handled concurrently
+FLEET_CONCURRENCY = 5
+
+
+async def run_fleet(labs, operation, max_concurrency=FLEET_CONCURRENCY):
+    """
+    Run an operation against every lab, at most max_concurrency at a time
+
+    :param labs: List of (lab ID, lab title) tuples
+    :param operation: Coroutine function called with a lab ID, returning a
+        Boolean indicating success (True) or failure (False)
+    :param max_concurrency: Maximum number of labs handled concurrently
+    :return: Dict of lab ID to (lab title, success boolean, seconds taken),
+        in the order of the labs argument
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_pod(lab_id, title):
+        async with semaphore:
+            start_time = perf_counter()
+            try:
+                result = bool(await operation(lab_id))
+            except HTTP_EXCEPTIONS as err:
+                print(f"Lab '{title}': {err}")
+                result = False
+            return lab_id, (title, result, perf_counter() - start_time)
+
+    return dict(await asyncio.gather(*(run_pod(lab_id, title) for lab_id, title in labs)))
+
+
+def print_fleet_summary(fleet_results):
+    """
+    Print the outcome and duration of the operation for every pod
+
+    :param fleet_results: Dict returned by run_fleet
+    :return: Boolean indicating all pods succeeded (True) or not (False)
+    """
+    print(f"\n{'Pod':<40} {'Result':<6} {'Time':>8}")
+    for title, result, elapsed in fleet_results.values():
+        print(f"{title:<40} {'OK' if result else 'FAIL':<6} {elapsed:7.1f}s")
+    failed = sum(1 for _, result, _ in fleet_results.values() if not result)
+    longest = max((elapsed for _, _, elapsed in fleet_results.values()), default=0)
+    print(f"{len(fleet_results)} pod(s), {failed} failed, slowest {longest:.1f}s\n")
+    return not failed
@@ -0,0 +1,167 @@
+"""
+Request metrics collected through session response hooks - per-endpoint
+latency histograms, retry counts, status codes and response sizes.  Results
+can be exported as JSON or in the Prometheus text exposition format.
+"""
+import json
+import re
+import threading
+from urllib.parse import urlparse
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Path segments replaced by "{id}" so requests for different labs/nodes are
+# reported under the same endpoint
+ID_SEGMENT_REGEX = re.compile(
+    r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{6,}|\d+|n\d+)$",
+    re.IGNORECASE,
+)
+
+
+def endpoint_name(url):
+    """
+    Reduce a URL to its path with object IDs replaced by "{id}"
+
+    :param url: Request URL
+    :return: Endpoint string, e.g. /api/v0/labs/{id}/nodes
+    """
+    segments = urlparse(url).path.split("/")
+    return "/".join("{id}" if ID_SEGMENT_REGEX.match(segment) else segment
+                    for segment in segments)
+
+
+class EndpointMetrics:
+    """
+    Counters for a single method/endpoint pair
+    """
+    def __init__(self):
+        self.count = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.bytes = 0
+        # Latency is only observed for responses from the network
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.status_codes = {}
+
+    def observe(self, latency, status_code, size, retries, from_cache=False):
+        """
+        Record one response.  The latency of cache hits is not observed, it
+        is the latency of the original network response.
+        """
+        self.count += 1
+        self.cache_hits += from_cache
+        self.retries += retries
+        self.bytes += size
+        if not from_cache:
+            self.latency_count += 1
+            self.latency_sum += latency
+            for index, upper_bound in enumerate(LATENCY_BUCKETS):
+                if latency <= upper_bound:
+                    self.latency_buckets[index] += 1
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def as_dict(self):
+        """
+        :return: Dict representation of the counters
+        """
+        return {
+            "count": self.count,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "latency_sum": round(self.latency_sum, 6),
+            "latency_count": self.latency_count,
+            "latency_avg": round(self.latency_sum / self.latency_count, 6)
+                           if self.latency_count else 0,
+            "latency_buckets": dict(zip((str(bound) for bound in LATENCY_BUCKETS),
+                                        self.latency_buckets)),
+            "status_codes": {str(code): count for code, count in self.status_codes.items()},
+        }
+
+
+class RequestMetrics:
+    """
+    Thread-safe collection of request metrics.  Pass an instance to
+    init_http_session (metrics=...) to record every response of the session.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    # pylint: disable-next=unused-argument
+    def response_hook(self, response, *args, **kwargs):
+        """
+        Requests response hook recording the latency, status code, size and
+        number of retries performed by urllib3 for the response.  Responses
+        answered by the session response cache are counted as cache hits.
+
+        :param response: requests Response object
+        :return: None, so the response is passed on unchanged
+        """
+        from_cache = getattr(response, "from_cache", False)
+        retry_state = getattr(response.raw, "retries", None)
+        retries = len(retry_state.history) if retry_state is not None and not from_cache else 0
+        size = len(response.content or b"")
+        key = (response.request.method, endpoint_name(response.request.url))
+        with self._lock:
+            self.endpoints.setdefault(key, EndpointMetrics()).observe(
+                response.elapsed.total_seconds(), response.status_code, size, retries, from_cache
+            )
+
+    def to_dict(self):
+        """
+        :return: Dict of "METHOD endpoint" to the endpoint counters
+        """
+        with self._lock:
+            return {f"{method} {endpoint}": metrics.as_dict()
+                    for (method, endpoint), metrics in sorted(self.endpoints.items())}
+
+    def to_json(self):
+        """
+        :return: Metrics as a JSON string
+        """
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix="apihelper"):
+        """
+        :param prefix: Metric name prefix
+        :return: Metrics in the Prometheus text exposition format
+        """
+        duration = f"{prefix}_request_duration_seconds"
+        histogram = [f"# TYPE {duration} histogram"]
+        retries = [f"# TYPE {prefix}_request_retries_total counter"]
+        cache_hits = [f"# TYPE {prefix}_cache_hits_total counter"]
+        sizes = [f"# TYPE {prefix}_response_bytes_total counter"]
+        responses = [f"# TYPE {prefix}_responses_total counter"]
+        with self._lock:
+            for (method, endpoint), metrics in sorted(self.endpoints.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                for upper_bound, count in zip(LATENCY_BUCKETS, metrics.latency_buckets):
+                    histogram.append(f'{duration}_bucket{{{labels},le="{upper_bound}"}} {count}')
+                histogram.append(f'{duration}_bucket{{{labels},le="+Inf"}} {metrics.latency_count}')
+                histogram.append(f"{duration}_sum{{{labels}}} {metrics.latency_sum}")
+                histogram.append(f"{duration}_count{{{labels}}} {metrics.latency_count}")
+                retries.append(f"{prefix}_request_retries_total{{{labels}}} {metrics.retries}")
+                cache_hits.append(f"{prefix}_cache_hits_total{{{labels}}} {metrics.cache_hits}")
+                sizes.append(f"{prefix}_response_bytes_total{{{labels}}} {metrics.bytes}")
+                for status_code, count in sorted(metrics.status_codes.items()):
+                    responses.append(
+                        f'{prefix}_responses_total{{{labels},code="{status_code}"}} {count}'
+                    )
+
+        lines = histogram + retries + cache_hits + sizes + responses
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to a file - JSON if the file name ends with ".json",
+        otherwise Prometheus text format.
+
+        :param path: Output file path
+        :return: None (no return)
+        """
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.to_json() if path.endswith(".json") else self.to_prometheus())
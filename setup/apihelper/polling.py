@@ -0,0 +1,69 @@
+"""
+Polling helpers - wait for a condition with exponential backoff, jitter and
+an overall deadline instead of sleeping for a fixed interval.
+"""
+import asyncio
+import random
+
+# Delay before the first re-check, in seconds
+POLL_INITIAL_DELAY = 0.5
+
+# Upper bound for the delay between checks, in seconds
+POLL_MAX_DELAY = 10
+
+# Multiplier applied to the delay after every check
+POLL_BACKOFF_FACTOR = 2
+
+
+def backoff_delays(initial=POLL_INITIAL_DELAY, maximum=POLL_MAX_DELAY,
+                   factor=POLL_BACKOFF_FACTOR):
+    """
+    Generate delays growing exponentially up to a maximum.  Each delay is
+    randomized between half and the full value ("equal jitter") so many
+    concurrent pollers do not hit the server in lockstep.
+
+    :param initial: First delay in seconds
+    :param maximum: Largest delay in seconds
+    :param factor: Multiplier applied after every delay
+    :return: Generator of delays in seconds
+    """
+    delay = initial
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(delay * factor, maximum)
+
+
+def deadline_after(timeout):
+    """
+    Compute a deadline on the event loop clock
+
+    :param timeout: Seconds from now, or None for no deadline
+    :return: Deadline usable with poll_until, or None
+    """
+    if timeout is None:
+        return None
+    return asyncio.get_running_loop().time() + timeout
+
+
+async def poll_until(check, deadline=None, initial=POLL_INITIAL_DELAY,
+                     maximum=POLL_MAX_DELAY):
+    """
+    Await check() until it returns a truthy value or the deadline passes
+
+    :param check: Coroutine function without arguments
+    :param deadline: Deadline from deadline_after(), or None to wait forever
+    :param initial: First delay between checks in seconds
+    :param maximum: Largest delay between checks in seconds
+    :return: The truthy result of check(), or None if the deadline passed
+    """
+    loop = asyncio.get_running_loop()
+    for delay in backoff_delays(initial, maximum):
+        if result := await check():
+            return result
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            delay = min(delay, remaining)
+        await asyncio.sleep(delay)
+    return None
@@ -0,0 +1,159 @@
+"""
+Readiness helpers - wait until the devices of a CML lab are actually usable
+after a lab start or node restart.  CML node state is watched with a single
+poller for the whole lab, then the management addresses from the pyATS
+testbed are probed over TCP until every device accepts connections.
+"""
+import asyncio
+import os
+from .apihelper import HTTP_EXCEPTIONS
+from .cmlindex import NodeIndex
+from .polling import deadline_after, poll_until
+from .responsecache import NO_CACHE
+
+# TCP ports which must accept connections for a device to be ready.  Only
+# SSH by default: HTTPS (443) is only enabled on the devices during the
+# labs, so it is not open after a fresh lab start.  Scripts accept other
+# ports with their "-p" option.
+READINESS_PORTS = (22,)
+
+# Seconds allowed for all devices to become ready
+READINESS_TIMEOUT = 900
+
+# Seconds allowed for a single TCP connection attempt
+PROBE_TIMEOUT = 2
+
+# CML node state reached once the node has finished booting
+BOOTED_STATE = "BOOTED"
+
+
+def load_testbed_addresses(testbed_file, device_names=None):
+    """
+    Read the management address of each device from a pyATS testbed file.
+    The "cli" connection is preferred, otherwise the first connection with
+    an "ip" key is used.
+
+    :param testbed_file: Path of the pyATS testbed YAML file
+    :param device_names: (Optional) Only return these devices (case-insensitive)
+    :return: Dict of device name to management IP address, or to None if
+        the device has no address in the testbed
+    :raises: OSError if the testbed file can't be read
+    """
+    # PyYAML is installed with pyATS; only needed when a testbed is used
+    import yaml  # pylint: disable=import-outside-toplevel
+
+    with open(os.path.expanduser(testbed_file), "r", encoding="utf-8") as testbed:
+        devices = (yaml.safe_load(testbed) or {}).get("devices", {})
+
+    if device_names is not None:
+        device_names = {device_name.lower() for device_name in device_names}
+
+    addresses = {}
+    for device_name, device in devices.items():
+        if device_names is not None and device_name.lower() not in device_names:
+            continue
+        # Devices without an address are still waited for until they boot
+        addresses[device_name] = None
+        connections = (device or {}).get("connections") or {}
+        for connection in [connections.get("cli", {}), *connections.values()]:
+            if isinstance(connection, dict) and connection.get("ip"):
+                addresses[device_name] = str(connection["ip"])
+                break
+    return addresses
+
+
+async def tcp_reachable(address, ports=READINESS_PORTS, timeout=PROBE_TIMEOUT):
+    """
+    Check that every port accepts a TCP connection
+
+    :param address: IP address or host name
+    :param ports: Iterable of TCP ports
+    :param timeout: Seconds allowed per connection attempt
+    :return: Boolean - True if all ports accepted a connection
+    """
+    for port in ports:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+    return True
+
+
+async def get_cml_node_states(async_session, lab_id):
+    """
+    Get the state of every node of a lab, with one request when the CML
+    release supports "nodes?data=true"
+
+    :param async_session: AsyncHTTPSession for the CML API
+    :param lab_id: ID of the lab
+    :return: Dict of node ID to node state
+    """
+    url = f"/api/v0/labs/{lab_id}/nodes"
+    node_response = await async_session.get(url, params={"data": "true"}, headers=NO_CACHE)
+    nodes = node_response.json()
+    if nodes and isinstance(nodes[0], dict):
+        return {node["id"]: node.get("state") for node in nodes}
+    responses = await asyncio.gather(
+        *(async_session.get(f"{url}/{node_id}/state", headers=NO_CACHE) for node_id in nodes)
+    )
+    return {node_id: state_response.json()["state"]
+            for node_id, state_response in zip(nodes, responses)}
+
+
+async def wait_for_lab_ready(async_session, lab_id, addresses, ports=READINESS_PORTS,
+                             timeout=READINESS_TIMEOUT):
+    """
+    Wait until every device has booted in CML and accepts TCP connections on
+    its management address.  Devices are probed as soon as their own node
+    has booted, so the wait ends as soon as the last device is reachable.
+
+    :param async_session: AsyncHTTPSession for the CML API
+    :param lab_id: ID of the lab containing the devices
+    :param addresses: Dict of device name (CML node label) to address, or
+        to None to only wait for the node to boot
+    :param ports: TCP ports which must accept connections
+    :param timeout: Seconds allowed for all devices to become ready
+    :return: Dict of device name to seconds until ready, or None if the
+        device was not ready before the deadline
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    deadline = deadline_after(timeout)
+
+    node_index = await NodeIndex(async_session, lab_id).nodes()
+    booted = {node_index[name.lower()]: asyncio.Event()
+              for name in addresses if name.lower() in node_index}
+
+    async def all_booted():
+        try:
+            node_states = await get_cml_node_states(async_session, lab_id)
+        except HTTP_EXCEPTIONS as err:
+            print(f"Unable to retrieve node states, retrying: {err}")
+            return False
+        for node_id, event in booted.items():
+            if node_states.get(node_id) == BOOTED_STATE:
+                event.set()
+        return all(event.is_set() for event in booted.values())
+
+    async def wait_device(device_name, address):
+        node_id = node_index.get(device_name.lower())
+        if node_id in booted:
+            try:
+                await asyncio.wait_for(booted[node_id].wait(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                return device_name, None
+        if address is None:
+            return device_name, loop.time() - start_time
+        if await poll_until(lambda: tcp_reachable(address, ports), deadline):
+            print(f"Device '{device_name}' ready after {loop.time() - start_time:.1f}s")
+            return device_name, loop.time() - start_time
+        return device_name, None
+
+    state_watcher = asyncio.create_task(poll_until(all_booted, deadline))
+    try:
+        return dict(await asyncio.gather(
+            *(wait_device(device_name, address) for device_name, address in addresses.items())
+        ))
+    finally:
+        state_watcher.cancel()
@@ -0,0 +1,244 @@
+"""
+Shared protections for sessions created by init_http_session, so that many
+concurrent callers degrade gracefully when the server is overloaded instead
+of multiplying its load:
+
+- A retry budget shared by all sessions: retries are only allowed while the
+  budget has tokens, which are earned as a fraction of regular requests.
+- A circuit breaker per host: after consecutive failures, requests fail fast
+  until a cool-down period has passed, then a single trial request is let
+  through to probe the host.
+- Retry-After responses defer every request to the same host, not only the
+  retried one.
+"""
+import threading
+import time
+import requests
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+# Fraction of a retry earned by every request sent
+RETRY_BUDGET_RATIO = 0.2
+
+# Retries always allowed per second, regardless of the request volume
+RETRY_BUDGET_MIN_PER_SECOND = 1.0
+
+# Maximum number of retries which can be saved up
+RETRY_BUDGET_MAX_TOKENS = 20
+
+# Consecutive failures opening the circuit of a host
+CIRCUIT_FAILURE_THRESHOLD = 5
+
+# Seconds a circuit stays open before a trial request is let through
+CIRCUIT_RESET_TIMEOUT = 30
+
+# Final response status codes counted as host failures
+CIRCUIT_FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request while the circuit of the host is open
+    """
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries across every session sharing it
+    """
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_BUDGET_MIN_PER_SECOND,
+                 max_tokens=RETRY_BUDGET_MAX_TOKENS):
+        """
+        Class initialization
+        :param ratio:
+            Fraction of a retry earned by each request
+        :param min_per_second:
+            Retries earned per second even without requests
+        :param max_tokens:
+            Maximum number of retries which can be saved up
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount=0.0):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens,
+                          self.tokens + amount + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """
+        Record a request, earning a fraction of a retry
+
+        :return: None (no return)
+        """
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        """
+        Take one retry from the budget
+
+        :return: Boolean - True if the retry is allowed
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker and Retry-After deferral for a single host
+    """
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        """
+        Class initialization
+        :param failure_threshold:
+            Consecutive failures opening the circuit
+        :param reset_timeout:
+            Seconds the circuit stays open before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.not_before = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """
+        Boolean - True while requests are being rejected
+        """
+        return self.opened_at is not None
+
+    def defer(self, seconds):
+        """
+        Hold back every request to the host for a number of seconds, e.g. as
+        requested by a Retry-After header
+
+        :param seconds: Seconds to wait before the next request
+        :return: None (no return)
+        """
+        with self._lock:
+            self.not_before = max(self.not_before, time.monotonic() + seconds)
+
+    def before_request(self, host):
+        """
+        Wait for any Retry-After deferral, then check the circuit
+
+        :param host: Host name, used in the error message
+        :return: Boolean - True if the request is the trial request of a
+            half-open circuit, which must be ended with end_trial()
+        :raises CircuitOpenError: The circuit is open
+        """
+        delay = self.not_before - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self.trial_in_progress or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit open for host {host} after "
+                                       f"{self.failures} consecutive failures")
+            # Half-open: let a single trial request through
+            self.trial_in_progress = True
+            return True
+
+    def end_trial(self):
+        """
+        Allow a new trial request once the trial request has ended, even if
+        it ended with an error that was not recorded
+
+        :return: None (no return)
+        """
+        with self._lock:
+            self.trial_in_progress = False
+
+    def record_success(self):
+        """
+        Close the circuit after a successful request
+
+        :return: None (no return)
+        """
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        """
+        Count a failed request, opening the circuit at the threshold
+
+        :return: None (no return)
+        """
+        with self._lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class CircuitBreakerRegistry:
+    """
+    Circuit breakers indexed by host name
+    """
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        """
+        :param host: Host name
+        :return: CircuitBreaker object of the host
+        """
+        with self._lock:
+            if (host := (host or "").lower()) not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold,
+                                                      self.reset_timeout)
+            return self._breakers[host]
+
+
+class BudgetedRetry(Retry):
+    """
+    urllib3 Retry which also draws from a shared RetryBudget and reports
+    Retry-After headers to the circuit breaker of the host, so every request
+    to that host is deferred.
+    """
+    def __init__(self, *args, budget=None, circuit_breakers=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+        self.circuit_breakers = circuit_breakers
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.budget = self.budget
+        retry.circuit_breakers = self.circuit_breakers
+        return retry
+
+    # pylint: disable-next=too-many-arguments
+    def increment(self, method=None, url=None, response=None, error=None,
+                  _pool=None, _stacktrace=None):
+        if response is not None and _pool is not None and self.circuit_breakers is not None:
+            if retry_after := self.get_retry_after(response):
+                self.circuit_breakers.get(_pool.host).defer(retry_after)
+
+        new_retry = super().increment(method=method, url=url, response=response, error=error,
+                                      _pool=_pool, _stacktrace=_stacktrace)
+
+        if self.budget is not None and not self.budget.withdraw():
+            raise MaxRetryError(_pool, url, error or ResponseError("retry budget exhausted"))
+        return new_retry
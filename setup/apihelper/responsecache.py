@@ -0,0 +1,200 @@
+"""
+Response cache for sessions created by init_http_session, cutting the number
+of identical GET requests sent while many helpers run concurrently:
+
+- Single-flight: while a GET is in flight, identical GETs from other threads
+  wait for it and share its response instead of sending their own request.
+- LRU/TTL cache: successful GET responses are reused for a few seconds.
+- Invalidation: a PUT, POST, PATCH or DELETE to a resource drops the cached
+  responses of that resource, of the resources containing it and of its
+  siblings, e.g. "PUT /labs/{id}/start" drops "GET /labs/{id}" and
+  "GET /labs/{id}/nodes".
+
+Requests sent with a "Cache-Control: no-cache" header (e.g. state polling)
+always reach the server; their response still refreshes the cache.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Seconds a cached GET response is reused
+RESPONSE_CACHE_TTL = 5
+
+# Maximum number of cached responses per session
+RESPONSE_CACHE_SIZE = 256
+
+# Methods whose response may be cached, and methods invalidating the cache
+CACHEABLE_METHODS = ("GET",)
+INVALIDATING_METHODS = ("PUT", "POST", "PATCH", "DELETE")
+
+# Request headers asking for a fresh response, e.g. when polling for a state
+NO_CACHE = {"Cache-Control": "no-cache"}
+
+
+class InFlightRequest:
+    """
+    Response (or exception) of a request shared with waiting threads
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of GET responses with a time to live, coalescing
+    identical in-flight requests
+    """
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_size=RESPONSE_CACHE_SIZE):
+        """
+        Class initialization
+        :param ttl:
+            Seconds a cached response is reused
+        :param max_size:
+            Maximum number of cached responses, least recently used first out
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(request):
+        """
+        :param request: requests PreparedRequest object
+        :return: Cache key of the request - method and full URL
+        """
+        return request.method, request.url
+
+    @staticmethod
+    def bypass(request):
+        """
+        :param request: requests PreparedRequest object
+        :return: Boolean - True if the request asked for a fresh response
+        """
+        cache_control = request.headers.get("Cache-Control", "").lower()
+        return "no-cache" in cache_control or "no-store" in cache_control
+
+    @staticmethod
+    def cached_copy(response, request):
+        """
+        Copy a shared response so callers and hooks cannot affect each other
+
+        :param response: Cached requests Response object
+        :param request: PreparedRequest the copy answers
+        :return: requests Response object
+        """
+        response_copy = copy.copy(response)
+        response_copy.headers = response.headers.copy()
+        response_copy.request = request
+        response_copy.from_cache = True
+        return response_copy
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def store(self, key, response):
+        """
+        Cache a successful response
+
+        :param key: Cache key of the request
+        :param response: requests Response object with its content loaded
+        :return: None (no return)
+        """
+        if not response.ok:
+            return
+        with self._lock:
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url=None):
+        """
+        Drop the cached responses of a resource, of the resources containing
+        it and of its siblings - or every cached response if no URL is given
+
+        :param url: URL of a resource which was modified
+        :return: None (no return)
+        """
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+                return
+            parsed = urlparse(url)
+            path = parsed.path.rstrip("/")
+            parent = path.rsplit("/", 1)[0]
+            for key in list(self._entries):
+                cached = urlparse(key[1])
+                cached_path = cached.path.rstrip("/")
+                if cached.netloc != parsed.netloc:
+                    continue
+                if (path == cached_path or path.startswith(f"{cached_path}/")
+                        or cached_path.startswith(f"{parent}/")):
+                    del self._entries[key]
+
+    def send(self, request, send_function):
+        """
+        Answer a request from the cache, from an identical in-flight request,
+        or by sending it
+
+        :param request: requests PreparedRequest object
+        :param send_function: Function sending the request and returning a
+            Response object with its content loaded
+        :return: requests Response object
+        """
+        if request.method in INVALIDATING_METHODS:
+            try:
+                return send_function()
+            finally:
+                self.invalidate(request.url)
+        if request.method not in CACHEABLE_METHODS:
+            return send_function()
+
+        key = self.cache_key(request)
+        if self.bypass(request):
+            response = send_function()
+            self.store(key, response)
+            return response
+
+        with self._lock:
+            if (response := self._lookup(key)) is not None:
+                self.hits += 1
+                return self.cached_copy(response, request)
+            if leader := key not in self._in_flight:
+                self._in_flight[key] = InFlightRequest()
+            in_flight = self._in_flight[key]
+
+        if not leader:
+            in_flight.done.wait()
+            with self._lock:
+                self.coalesced += 1
+            if in_flight.error is not None:
+                raise in_flight.error
+            return self.cached_copy(in_flight.response, request)
+
+        try:
+            in_flight.response = send_function()
+            self.store(key, in_flight.response)
+            return in_flight.response
+        except BaseException as err:
+            in_flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.done.set()
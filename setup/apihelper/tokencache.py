@@ -0,0 +1,198 @@
+"""
+Token cache and bearer authentication with transparent re-authentication.
+
+Tokens are stored on disk per host and username so repeated script runs can
+reuse a still-valid token instead of authenticating every time.  The expiry
+is read from the token itself when it is a JWT (as issued by CML), otherwise
+a default lifetime is assumed.
+"""
+import base64
+import json
+import os
+import threading
+import time
+from .apihelper import BearerAuth
+
+# Location of the on-disk token cache; override with the CML_TOKEN_CACHE
+# environment variable
+DEFAULT_TOKEN_CACHE = os.environ.get(
+    "CML_TOKEN_CACHE", os.path.expanduser("~/.cache/cml_tokens.json")
+)
+
+# Lifetime assumed for tokens which do not carry an expiry (seconds)
+DEFAULT_TOKEN_LIFETIME = 3600
+
+# Treat tokens as expired this many seconds before their real expiry
+EXPIRY_MARGIN = 60
+
+
+def token_expiry(token, default_lifetime=DEFAULT_TOKEN_LIFETIME):
+    """
+    Determine when a token expires.  JWT tokens carry an "exp" claim in the
+    payload; the signature is not validated as the server does that.
+
+    :param token: Token string
+    :param default_lifetime: Lifetime in seconds if no expiry can be read
+    :return: Expiry as a UNIX timestamp
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + default_lifetime
+
+
+def load_json_file(path):
+    """
+    Read a JSON cache file
+
+    :param path: Path of the JSON file
+    :return: Parsed content, or an empty dict if missing or unreadable
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json_file(path, content):
+    """
+    Write a JSON cache file readable only by the current user.  Content is
+    written to a temporary file then renamed, so concurrent script runs never
+    read a partially written file.
+
+    :param path: Path of the JSON file
+    :param content: JSON serializable content
+    :return: None (no return)
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+              "w", encoding="utf-8") as cache_file:
+        json.dump(content, cache_file)
+    os.replace(temp_path, path)
+
+
+class TokenCache:
+    """
+    JSON file based token cache, keyed by host and username.
+    """
+    def __init__(self, path=DEFAULT_TOKEN_CACHE):
+        """
+        Class initialization
+        :param path:
+            String - path of the JSON file holding cached tokens
+        """
+        self.path = path
+
+    @staticmethod
+    def _key(host, username):
+        return f"{username}@{host}"
+
+    def get(self, host, username):
+        """
+        Return a cached token which is not about to expire
+
+        :param host: Host (or base URL) the token was issued by
+        :param username: User the token was issued to
+        :return: Token string, or None if no valid token is cached
+        """
+        entry = load_json_file(self.path).get(self._key(host, username))
+        if entry and entry["expires"] - EXPIRY_MARGIN > time.time():
+            return entry["token"]
+        return None
+
+    def set(self, host, username, token):
+        """
+        Store a token in the cache
+
+        :param host: Host (or base URL) the token was issued by
+        :param username: User the token was issued to
+        :param token: Token string
+        :return: None (no return)
+        """
+        entries = load_json_file(self.path)
+        # Drop anything expired while the file is being rewritten anyway
+        now = time.time()
+        entries = {key: entry for key, entry in entries.items()
+                   if entry.get("expires", 0) > now}
+        entries[self._key(host, username)] = {
+            "token": token,
+            "expires": token_expiry(token),
+        }
+        try:
+            save_json_file(self.path, entries)
+        except OSError as err:
+            print(f"Unable to write token cache {self.path}: {err}")
+
+    def invalidate(self, host, username):
+        """
+        Remove a token from the cache
+
+        :param host: Host (or base URL) the token was issued by
+        :param username: User the token was issued to
+        :return: None (no return)
+        """
+        entries = load_json_file(self.path)
+        if entries.pop(self._key(host, username), None) is not None:
+            try:
+                save_json_file(self.path, entries)
+            except OSError as err:
+                print(f"Unable to write token cache {self.path}: {err}")
+
+
+class RefreshingBearerAuth(BearerAuth):
+    """
+    BearerAuth which re-authenticates when the server rejects the token with
+    HTTP 401, then re-sends the original request once with the new token.
+    """
+    def __init__(self, token, refresh):
+        """
+        Class initialization
+        :param token:
+            String - initial token used for the "Authorization" header
+        :param refresh:
+            Callable returning a new token string (or None on failure)
+        """
+        super().__init__(token)
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+    def __call__(self, r):
+        r = super().__call__(r)
+        # Run before any other response hook (e.g. raise_for_status)
+        r.hooks["response"].insert(0, self.handle_401)
+        return r
+
+    def handle_401(self, response, **kwargs):
+        """
+        Response hook - on HTTP 401, obtain a new token and retry the request
+
+        :param response: requests Response object
+        :param kwargs: Arguments of the original send() call
+        :return: Response of the retried request, or the original response
+        """
+        if response.status_code != 401 or getattr(response.request, "_token_retried", False):
+            return response
+
+        used_token = response.request.headers.get("Authorization", "")[len("Bearer "):]
+        with self._lock:
+            # Another thread may have refreshed the token already
+            if used_token == self.token:
+                new_token = self.refresh()
+                if not new_token:
+                    return response
+                self.token = new_token
+
+        # Consume the content and release the connection before re-sending
+        _ = response.content
+        response.close()
+        retry_request = response.request.copy()
+        retry_request.headers["Authorization"] = "Bearer " + self.token
+        retry_request._token_retried = True  # pylint: disable=protected-access
+        retry_response = response.connection.send(retry_request, **kwargs)
+        retry_response.history.append(response)
+        retry_response.request = retry_request
+        return retry_response
@@ -0,0 +1,154 @@
+"""
+Benchmark for the CML setup scripts, run against the local fake CML server.
+
+For every scale (number of labs and number of nodes in the target lab), the
+scripts are executed as they would be by a proctor - first with empty token
+and index caches ("cold"), then again reusing the caches ("warm") - and the
+wall time and number of API requests are reported.
+
+Results can be saved and later used as a baseline: the benchmark exits with
+a non-zero status if a scenario needs more requests than the baseline, or is
+slower than the baseline by more than the tolerance.
+
+Example:
+    python benchmark_setup.py --scales 10 100 1000 --save baseline.json
+    python benchmark_setup.py --baseline baseline.json
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+from fake_cml import FakeCML
+
+SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SCALES = (10, 100, 1000)
+
+# Script and arguments of each scenario; {last_node} is the label of the
+# last node of the target lab
+SCENARIOS = {
+    "lab start": ["launch_topology.py"],
+    "node restart": ["reboot_cml_device.py", "-n", "{last_node}"],
+    "restart all nodes": ["reboot_cml_device.py", "-a"],
+    "fleet lab start": ["launch_topology.py", "-f"],
+    "fleet node restart": ["reboot_cml_device.py", "-f", "-n", "{last_node}"],
+}
+
+
+def run_scenario(fake_cml, arguments, cache_dir):
+    """
+    Execute a setup script against the fake CML server
+
+    :param fake_cml: Running FakeCML object
+    :param arguments: Script name followed by its arguments
+    :param cache_dir: Directory holding the token and index caches
+    :return: Dict with wall time, request counts and exit status
+    """
+    env = dict(os.environ,
+               CML_BASE_URL=fake_cml.base_url,
+               CML_TOKEN_CACHE=os.path.join(cache_dir, "tokens.json"),
+               CML_INDEX_CACHE=os.path.join(cache_dir, "index.json"))
+    fake_cml.reset_counts()
+    start_time = perf_counter()
+    result = subprocess.run([sys.executable, *arguments], cwd=SCRIPT_PATH, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            check=False, text=True)
+    wall_time = perf_counter() - start_time
+    if result.returncode:
+        print(result.stderr, file=sys.stderr)
+    return {
+        "wall_time": round(wall_time, 3),
+        "requests": fake_cml.total_requests,
+        "endpoints": dict(sorted(fake_cml.request_counts.items())),
+        "exit_status": result.returncode,
+    }
+
+
+# pylint: disable-next=too-many-arguments
+def run_benchmark(scales, latency, stop_delay, boot_delay, legacy, pods=1):
+    """
+    Run every scenario at every scale, cold then warm
+
+    :return: Dict of "scenario/scale/cache" to the scenario result
+    """
+    results = {}
+    for scale in scales:
+        fake_cml = FakeCML(labs=scale, nodes=scale, latency=latency, stop_delay=stop_delay,
+                           boot_delay=boot_delay, legacy=legacy, pods=pods).start()
+        try:
+            for scenario, arguments in SCENARIOS.items():
+                arguments = [argument.format(last_node=f"node-{scale - 1}")
+                             for argument in arguments]
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    for cache in ("cold", "warm"):
+                        name = f"{scenario}/{scale}/{cache}"
+                        results[name] = run_scenario(fake_cml, arguments, cache_dir)
+                        print(f"{name:<32} {results[name]['wall_time']:8.2f}s "
+                              f"{results[name]['requests']:7d} requests"
+                              f"{'' if not results[name]['exit_status'] else '  FAILED'}")
+        finally:
+            fake_cml.stop()
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare results to a baseline
+
+    :param results: Results of this run
+    :param baseline: Results of a previous run
+    :param tolerance: Allowed relative wall time increase, e.g. 0.5 for 50%
+    :return: List of regression descriptions, empty if none
+    """
+    regressions = []
+    for name, result in results.items():
+        if result["exit_status"]:
+            regressions.append(f"{name}: script failed")
+        if name not in baseline:
+            continue
+        if result["requests"] > baseline[name]["requests"]:
+            regressions.append(f"{name}: {result['requests']} requests, "
+                               f"baseline {baseline[name]['requests']}")
+        if result["wall_time"] > baseline[name]["wall_time"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['wall_time']:.2f}s, "
+                               f"baseline {baseline[name]['wall_time']:.2f}s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="Number of labs and of nodes in the target lab")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Seconds added to every fake CML response")
+    parser.add_argument("--stop-delay", type=float, default=0.5,
+                        help="Seconds for a fake node to stop")
+    parser.add_argument("--boot-delay", type=float, default=1.0,
+                        help="Seconds for a fake node to boot")
+    parser.add_argument("--legacy", action="store_true",
+                        help="Emulate a CML release without bulk endpoints")
+    parser.add_argument("--pods", type=int, default=1,
+                        help="Number of target labs, exercised by the fleet scenarios")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative wall time increase over the baseline")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmark(args.scales, args.latency, args.stop_delay,
+                                      args.boot_delay, args.legacy, args.pods)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as results_file:
+            json.dump(benchmark_results, results_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            found = compare_to_baseline(benchmark_results, json.load(baseline_file),
+                                        args.tolerance)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if found else 0)
@@ -1,10 +1,16 @@
 """
 Credentials for CML instance
 """
+import os
+
 CML_USER = "guest"
 CML_PASSWORD = "C1sco12345"
 CML_HOST = "198.18.134.1"
 
+# Base URL of the CML API - set CML_BASE_URL in the environment to target
+# another instance, e.g. the local stand-in started by fake_cml.py
+CML_BASE_URL = os.environ.get("CML_BASE_URL", f"https://{CML_HOST}")
+
 auth_payload = {
     "username": CML_USER,
     "password": CML_PASSWORD
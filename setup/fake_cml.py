@@ -0,0 +1,282 @@
+"""
+Local stand-in for the CML API, used to exercise launch_topology.py and
+reboot_cml_device.py without a live CML instance.
+
+Implements the endpoints used by the setup scripts (authenticate, labs, lab
+details and tiles, lab start, nodes, node details and node state) with a
+configurable response latency and node state transition delays.  Every
+request is counted per endpoint so benchmarks can report request totals.
+
+Example:
+    python fake_cml.py --labs 100 --nodes 20 --port 8080
+    CML_BASE_URL=http://127.0.0.1:8080 python launch_topology.py
+"""
+import base64
+import json
+import re
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Title of the lab located by the setup scripts
+TARGET_LAB_TITLE = "LTRCRT-2157 Student Pod"
+
+# Lifetime of issued tokens in seconds
+TOKEN_LIFETIME = 3600
+
+
+def fake_token(username, lifetime=TOKEN_LIFETIME):
+    """
+    Build an (unsigned) JWT shaped token with an expiry claim
+
+    :param username: Subject of the token
+    :param lifetime: Seconds until the token expires
+    :return: Token string
+    """
+    def encode(content):
+        return base64.urlsafe_b64encode(json.dumps(content).encode()).decode().rstrip("=")
+
+    return ".".join((encode({"alg": "none", "typ": "JWT"}),
+                     encode({"sub": username, "exp": int(time.time() + lifetime)}),
+                     "fake"))
+
+
+class FakeNode:
+    """
+    CML node with delayed state transitions
+    """
+    def __init__(self, node_id, label):
+        self.node_id = node_id
+        self.label = label
+        self.state = "STOPPED"
+        self.next_state = None
+        self.next_state_at = 0.0
+
+    def current_state(self):
+        """
+        :return: Node state, applying any transition which is due
+        """
+        if self.next_state and time.monotonic() >= self.next_state_at:
+            self.state, self.next_state = self.next_state, None
+        return self.state
+
+    def transition(self, interim_state, final_state, delay):
+        """
+        Change to interim_state now and to final_state after delay seconds
+        """
+        self.state = interim_state
+        self.next_state = final_state
+        self.next_state_at = time.monotonic() + delay
+
+    def as_dict(self, legacy=False):
+        """
+        :param legacy: Nest the label under "data" like older CML releases
+        :return: Node details
+        """
+        if legacy:
+            return {"id": self.node_id, "data": {"label": self.label}}
+        return {"id": self.node_id, "label": self.label, "state": self.current_state()}
+
+
+class FakeLab:
+    """
+    CML lab holding a set of nodes
+    """
+    def __init__(self, lab_id, title, node_count):
+        self.lab_id = lab_id
+        self.title = title
+        self.state = "STOPPED"
+        self.nodes = {f"n{index}": FakeNode(f"n{index}", f"node-{index}")
+                      for index in range(node_count)}
+
+
+class FakeCML:
+    """
+    Fake CML instance served over HTTP from a background thread
+    """
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, labs=10, nodes=10, latency=0.0, stop_delay=0.5, boot_delay=1.0,
+                 legacy=False, host="127.0.0.1", port=0, pods=1):
+        """
+        Class initialization
+        :param labs: Number of labs, the last ones being the target labs
+        :param nodes: Number of nodes of each target lab
+        :param latency: Seconds added to every response
+        :param stop_delay: Seconds for a node to reach STOPPED
+        :param boot_delay: Seconds for a node to reach BOOTED after a start
+        :param legacy: Emulate an older CML release without bulk endpoints
+        :param host: Listen address
+        :param port: Listen port, 0 to pick a free port
+        :param pods: Number of target labs (one per attendee pod)
+        """
+        self.latency = latency
+        self.stop_delay = stop_delay
+        self.boot_delay = boot_delay
+        self.legacy = legacy
+        self.labs = {}
+        for index in range(labs):
+            lab_id = f"{index:08x}-0000-4000-8000-{index:012x}"
+            if index >= labs - pods:
+                title = TARGET_LAB_TITLE if pods == 1 else f"{TARGET_LAB_TITLE} {labs - index:02d}"
+                self.labs[lab_id] = FakeLab(lab_id, title, nodes)
+            else:
+                self.labs[lab_id] = FakeLab(lab_id, f"Lab {index:04d}", 0)
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """
+        URL to use as CML_BASE_URL
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_requests(self):
+        """
+        Number of requests served since the last reset
+        """
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def reset_counts(self):
+        """
+        Reset the request counters
+        """
+        with self._lock:
+            self.request_counts = {}
+
+    def start(self):
+        """
+        Serve requests from a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving requests
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, method, path):
+        endpoint = re.sub(r"/(n\d+|[0-9a-f-]{36})(?=/|$)", "/{id}", path)
+        with self._lock:
+            key = f"{method} {endpoint}"
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    # pylint: disable-next=too-many-return-statements, too-many-branches
+    def handle(self, method, path, query):
+        """
+        Route a request
+
+        :return: Tuple of (status code, JSON serializable body)
+        """
+        parts = path.strip("/").split("/")[2:]  # strip "api/v0"
+        if method == "POST" and parts == ["authenticate"]:
+            return 200, fake_token("guest")
+        if method == "GET" and parts == ["populate_lab_tiles"] and not self.legacy:
+            return 200, {"lab_tiles": {lab.lab_id: {"lab_title": lab.title, "state": lab.state}
+                                       for lab in self.labs.values()}}
+        if not parts or parts[0] != "labs":
+            return 404, {"description": "Not found"}
+        if len(parts) == 1 and method == "GET":
+            return 200, list(self.labs)
+
+        lab = self.labs.get(parts[1])
+        if lab is None:
+            return 404, {"description": "Lab not found"}
+        if len(parts) == 2 and method == "GET":
+            return 200, {"id": lab.lab_id, "lab_title": lab.title, "state": lab.state,
+                         "node_count": len(lab.nodes)}
+        if parts[2:] == ["start"] and method == "PUT":
+            lab.state = "STARTED"
+            for node in lab.nodes.values():
+                node.transition("STARTED", "BOOTED", self.boot_delay)
+            return 204, None
+        if parts[2:] == ["nodes"] and method == "GET":
+            if query.get("data") == ["true"] and not self.legacy:
+                return 200, [node.as_dict() for node in lab.nodes.values()]
+            return 200, list(lab.nodes)
+
+        node = lab.nodes.get(parts[3]) if len(parts) > 3 and parts[2] == "nodes" else None
+        if node is None:
+            return 404, {"description": "Node not found"}
+        if len(parts) == 4 and method == "GET":
+            return 200, node.as_dict(legacy=self.legacy)
+        if parts[4:] == ["state"] and method == "GET":
+            return 200, {"state": node.current_state()}
+        if parts[4:] == ["state", "stop"] and method == "PUT":
+            node.transition(node.current_state(), "STOPPED", self.stop_delay)
+            return 204, None
+        if parts[4:] == ["state", "start"] and method == "PUT":
+            node.transition("STARTED", "BOOTED", self.boot_delay)
+            return 204, None
+        return 405, {"description": "Method not allowed"}
+
+    def _handler_class(self):
+        fake_cml = self
+
+        class FakeCMLRequestHandler(BaseHTTPRequestHandler):
+            """
+            Dispatch HTTP requests to the FakeCML instance
+            """
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+            def _respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                url = urlparse(self.path)
+                fake_cml._count(self.command, url.path)
+                if fake_cml.latency:
+                    time.sleep(fake_cml.latency)
+                if self.command != "POST" and not self.headers.get("Authorization"):
+                    status, body = 401, {"description": "No token"}
+                else:
+                    status, body = fake_cml.handle(self.command, url.path, parse_qs(url.query))
+                content = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_PUT = do_POST = _respond  # noqa: N815
+
+        return FakeCMLRequestHandler
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--labs", type=int, default=10, help="Number of labs")
+    parser.add_argument("--nodes", type=int, default=10, help="Number of nodes in each target lab")
+    parser.add_argument("--pods", type=int, default=1, help="Number of target labs")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every response")
+    parser.add_argument("--stop-delay", type=float, default=0.5, help="Seconds for a node to stop")
+    parser.add_argument("--boot-delay", type=float, default=1.0, help="Seconds for a node to boot")
+    parser.add_argument("--legacy", action="store_true", help="Disable bulk endpoints")
+    parser.add_argument("--port", type=int, default=8080, help="Listen port")
+    args = parser.parse_args()
+
+    server = FakeCML(labs=args.labs, nodes=args.nodes, latency=args.latency,
+                     stop_delay=args.stop_delay, boot_delay=args.boot_delay,
+                     legacy=args.legacy, port=args.port, pods=args.pods).start()
+    print(f"Fake CML listening on {server.base_url} - press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
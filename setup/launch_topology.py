@@ -1,14 +1,15 @@
 """
-Simple script to locate CML topology with title including "clus" and call the
-lab start API.
+Simple script to locate CML topology with title including "ltrcrt-2157" and
+call the lab start API.
 
 Error checking is minimal - rapid prototype for lab use
 """
 from sys import exit as sysexit
-import requests
+from argparse import ArgumentParser
 from urllib3 import disable_warnings
-from cml_creds import CML_HOST, auth_payload
-from apihelper import http_exceptions, init_http_session, BearerAuth, close_http_session
+from cml_creds import CML_BASE_URL, auth_payload
+from apihelper import (CMLClient, RequestMetrics, print_fleet_summary, FLEET_CONCURRENCY,
+                       READINESS_PORTS, title_pattern)
 
 # Global TLS verification - False if using self-signed certificates
 TLS_VERIFY = False
@@ -18,110 +19,100 @@ if not TLS_VERIFY:
     disable_warnings()
 
 # Base URL for the HTTP session
-BASE_URL = f"https://{CML_HOST}"
+BASE_URL = CML_BASE_URL
 
-# Generic application/json headers
-HTTP_HEADERS = {
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+# Title (or regular expression) of the lab to locate
+LAB_TITLE = "ltrcrt-2157"
 
-# Authenticate, get a token, and create an HTTP session.  Retry until
-# MAX_RETRIES is hit, otherwise exit the script
-CML_TOKEN = None
-MAX_RETRIES = 5
-RETRY = 1
+# pyATS testbed defining the management address of each device
+TESTBED = "~/abc-en/pyats-testbed/testbed.yml"
 
-while not CML_TOKEN:
-    if RETRY == MAX_RETRIES:
-        sysexit("Maximum retry limit reached, unable to connect to CML. "
-                "Check settings and CML host reachability.")
-    else:
-        try:
-            print(f"Attempting to authenticate to CML at {BASE_URL} (attempt #{RETRY})...")
-            cml_auth_url = f"{BASE_URL}/api/v0/authenticate"
-            auth_response = requests.post(url=cml_auth_url,
-                                          json=auth_payload,
-                                          headers=HTTP_HEADERS,
-                                          verify=TLS_VERIFY,
-                                          timeout=5)
-            CML_TOKEN = auth_response.json()
-        # pylint: disable-next=broad-except
-        except Exception as err:  # Catch any exception, not worried about specifics
-            print(f"Exception encountered during authentication.  Details:\n{err}")
-            RETRY += 1
-        else:
-            # Use init_http_session from apihelper to start a BaseUrlSession
-            # with bearer token auth, TLS validation disabled, and generic
-            # application/json headers
-            print("Authentication success!  Initializing the HTTP session...")
-            http_session = init_http_session(baseurl=BASE_URL, auth=BearerAuth(token=CML_TOKEN))
-            http_session.verify = TLS_VERIFY
-            http_session.headers.update(
-                {
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-            )
-
-
-@http_exceptions
-def get_cml_labs():
-    """
-    Get all labs from the CML instance.
-
-    :return: JSON response containing a list of lab IDs
-    """
-    url = "/api/v0/labs"
-    print("Retrieving available labs from CML...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
-
-
-@http_exceptions
-def get_cml_lab_details(lab_id):
-    """
-    Get the details of a specific lab
-
-    :param lab_id: ID of the lab to retrieve
-    :return: JSON response containing the lab details
-    """
-    url = f"/api/v0/labs/{lab_id}"
-    print(f"Retrieving details for lab with ID '{lab_id}' from CML...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
+# Latency, retry and status code metrics of every CML API request
+request_metrics = RequestMetrics()
 
-
-@http_exceptions
-def start_cml_lab(lab_id):
-    """
-    Send a start request for the specified lab
-
-    :param lab_id: ID of the lab to start
-    :return: HTTP response of the start request
-    """
-    url = f"/api/v0/labs/{lab_id}/start"
-    print(f"Starting CML topology with ID '{lab_id}'...")
-    lab_response = http_session.put(url=url)
-    return lab_response
+# CML client with bearer token auth, TLS validation disabled, and generic
+# application/json headers.  No connection is made until the first request.
+cml_client = CMLClient(BASE_URL, auth_payload, verify=TLS_VERIFY, metrics=request_metrics)
 
 
 if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-l",
+                        dest="lab_titles",
+                        action="store",
+                        nargs="+",
+                        type=title_pattern,
+                        help="Title(s) (or regular expressions) of the lab(s) to start",
+                        default=[LAB_TITLE])
+    parser.add_argument("-f",
+                        dest="fleet",
+                        action="store_true",
+                        help="Fleet mode - start every matching lab, not only the first")
+    parser.add_argument("-c",
+                        dest="concurrency",
+                        action="store",
+                        type=int,
+                        help="Maximum number of labs handled concurrently in fleet mode",
+                        default=FLEET_CONCURRENCY)
+    parser.add_argument("-w",
+                        dest="wait",
+                        action="store_true",
+                        help="Wait until the devices are reachable before exiting")
+    parser.add_argument("-b",
+                        dest="testbed_file",
+                        action="store",
+                        help="pyATS testbed defining the management address of each device",
+                        default=TESTBED)
+    parser.add_argument("-p",
+                        dest="ports",
+                        action="store",
+                        nargs="+",
+                        type=int,
+                        help="TCP ports which must accept connections with -w",
+                        default=list(READINESS_PORTS))
+    parser.add_argument("-m",
+                        dest="metrics_file",
+                        action="store",
+                        help="Write request metrics to this file (JSON if named *.json, "
+                             "otherwise Prometheus text format)")
+    args = parser.parse_known_args()[0]
+
+    # Authenticate (reusing a cached token when still valid).  Exit the
+    # script if CML can't be reached.
+    if not cml_client.connect():
+        sysexit("Maximum retry limit reached, unable to connect to CML. "
+                "Check settings and CML host reachability.")
 
-    cml_labs = get_cml_labs()
-    print(f"Got labs: {cml_labs}")
-
-    try:
-        for lab in cml_labs:
-            lab_details = get_cml_lab_details(lab)
-            if "ltrcrt-2157" in lab_details.get("lab_title").lower():
-                start_response = start_cml_lab(lab)
-                print(f"Start request sent.  Response status code: {start_response.status_code}")
-                lab_status = get_cml_lab_details(lab)
-                print(f"Status of lab from CML: {lab_status.get('state')}")
-                break
-    except TypeError:
-        print("No labs retrieved from CML, check settings and re-try.")
+    # Set to False by any failure, so the exit code can gate a pipeline
+    devices_ready = True
+    labs = cml_client.find_labs(args.lab_titles)
+    if labs and args.fleet:
+        print(f"Starting {len(labs)} lab(s), {args.concurrency} at a time...")
+        fleet_results = cml_client.start_labs(labs, wait=args.wait,
+                                              max_concurrency=args.concurrency)
+        devices_ready = bool(fleet_results) and print_fleet_summary(fleet_results)
+    elif labs:
+        lab = labs[0][0]
+        start_response = cml_client.start_lab(lab)
+        if start_response:
+            print(f"Start request sent.  Response status code: {start_response.status_code}")
+            lab_status = cml_client.get_lab_details(lab)
+            print(f"Status of lab from CML: {lab_status.get('state')}")
+            if args.wait:
+                devices_ready = cml_client.wait_for_devices(lab, args.testbed_file,
+                                                           ports=args.ports)
+        else:
+            print("Unable to start the lab in CML.")
+            devices_ready = False
+    else:
+        print("No matching lab retrieved from CML, check settings and re-try.")
+        devices_ready = False
 
     print("Closing HTTP session...")
-    close_http_session(http_session)
+    cml_client.close()
+
+    if args.metrics_file:
+        request_metrics.write(args.metrics_file)
+
+    if not devices_ready:
+        sysexit("Problem starting the lab(s) or reaching the devices, check the messages above.")
@@ -73,6 +73,10 @@ for LAB in ${LABS}; do
   fi
 done
 
+echo "Preparing shared pyATS helpers..."
+mkdir -p ${TARGET_DIRECTORY}/pyatshelper
+cp -prf ${SCRIPT_BASEPATH}/pyatshelper/. ${TARGET_DIRECTORY}/pyatshelper/
+
 echo
 echo "******************************************************************************"
 echo "Lab preparation tasks complete!"
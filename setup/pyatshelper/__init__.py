@@ -0,0 +1,10 @@
+"""
+Define available imports from this package
+"""
+from .snapshotstore import SnapshotStore, config_section
+from .broker import attach, SessionBroker, BrokeredDevice
+from .timing import PhaseTimer, percentile
+from .scheduler import DeviceScheduler, device_group
+from .templatecache import get_jinja_template, load_jinja_template
+from .artifacts import ArtifactStore, artifact_name, DEFAULT_BUILD_DIR
+from .jobtasks import task_arguments, run_device_tasks, shard_devices
@@ -0,0 +1,199 @@
+"""
+Build artifacts - configuration rendered for each device before any device
+is touched, so the configuration can be reviewed and only the changed
+configuration pushed.
+
+Scripts work in two stages:
+1. Render: the configuration of every device is rendered from the testbed
+   (several devices at a time) and saved in the build directory, with the
+   SHA-256 hash of each artifact in the manifest
+2. Push: each artifact is read from the build directory and sent to the
+   device, unless the same content (same hash) was already pushed
+
+Artifacts are saved as:
+    <build_dir>/<device>/<artifact name>
+    <build_dir>/manifest.json   - hash of each artifact rendered
+    <build_dir>/pushed.json     - hash of each artifact last pushed
+
+The build directory defaults to "build" in the current directory, or the
+PYATS_BUILD_DIR environment variable.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Directory holding the rendered artifacts
+DEFAULT_BUILD_DIR = os.environ.get("PYATS_BUILD_DIR", "build")
+
+# Number of devices rendered at the same time
+RENDER_WORKERS = 8
+
+# Files of the build directory holding the rendered and pushed hashes
+MANIFEST_FILE = "manifest.json"
+PUSHED_FILE = "pushed.json"
+
+
+def content_hash(content):
+    """
+    :param content: Artifact content
+    :return: SHA-256 hash of the content
+    """
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def artifact_name(*parts):
+    """
+    File name of an artifact, e.g. artifact_name("GigabitEthernet0/0/1",
+    "area.json") returns "GigabitEthernet0_0_1_area.json"
+
+    :param parts: Name parts, joined with "_"
+    :return: Artifact name usable as a file name
+    """
+    return re.sub(r"[^\w.-]+", "_", "_".join(parts))
+
+
+def _write_file(path, content):
+    """
+    Write a file through a temporary file, so readers never see partial
+    content
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False,
+                                     encoding="utf-8") as artifact_file:
+        artifact_file.write(content)
+    os.replace(artifact_file.name, path)
+
+
+class ArtifactStore:
+    """
+    Renders, saves and tracks the pushes of device configuration artifacts
+    """
+    def __init__(self, build_dir=DEFAULT_BUILD_DIR):
+        """
+        Class initialization
+        :param build_dir:
+            Directory holding the rendered artifacts
+        """
+        self.build_dir = os.path.expanduser(build_dir)
+        self._lock = threading.Lock()
+        self.manifest = self._load(MANIFEST_FILE)
+        self.pushed = self._load(PUSHED_FILE)
+
+    def _load(self, file_name):
+        try:
+            with open(os.path.join(self.build_dir, file_name), "r",
+                      encoding="utf-8") as hash_file:
+                return json.load(hash_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, file_name, hashes):
+        _write_file(os.path.join(self.build_dir, file_name),
+                    json.dumps(hashes, indent=2, sort_keys=True))
+
+    def path(self, device_name, name):
+        """
+        :param device_name: Device name from the testbed
+        :param name: Artifact name
+        :return: Path of the artifact file
+        """
+        return os.path.join(self.build_dir, device_name, name)
+
+    def artifacts(self, device_name):
+        """
+        :param device_name: Device name from the testbed
+        :return: Dict of artifact name to hash of the last render
+        """
+        return dict(self.manifest.get(device_name, {}))
+
+    def read(self, device_name, name):
+        """
+        :param device_name: Device name from the testbed
+        :param name: Artifact name
+        :return: Artifact content, or None if the artifact was not rendered
+        """
+        if name not in self.manifest.get(device_name, {}):
+            return None
+        with open(self.path(device_name, name), "r", encoding="utf-8") as artifact_file:
+            return artifact_file.read()
+
+    def save_device(self, device_name, device_artifacts):
+        """
+        Save the artifacts of a device, replacing those of the last render.
+        Files are only written if their content changed.
+
+        :param device_name: Device name from the testbed
+        :param device_artifacts: Dict of artifact name to content
+        :return: Dict of artifact name to hash
+        """
+        hashes = {}
+        previous = self.artifacts(device_name)
+        for name, content in device_artifacts.items():
+            hashes[name] = content_hash(content)
+            if previous.get(name) != hashes[name] or not os.path.exists(
+                    self.path(device_name, name)):
+                _write_file(self.path(device_name, name), content)
+        for name in set(previous) - set(hashes):
+            try:
+                os.remove(self.path(device_name, name))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.manifest[device_name] = hashes
+        return hashes
+
+    def render(self, devices, render_device, max_workers=RENDER_WORKERS):
+        """
+        Render the artifacts of each device, several devices at a time, and
+        save the manifest
+
+        :param devices: Iterable of pyATS device objects
+        :param render_device: Function called with each device, returning a
+            dict of artifact name to content
+        :param max_workers: Number of devices rendered at the same time
+        :return: Dict of device name to a dict of artifact name to hash, or
+            to the exception raised while rendering the device (the device
+            then has no artifacts)
+        """
+        def render_one(device):
+            try:
+                return self.save_device(device.name, render_device(device))
+            except Exception as err:  # pylint: disable=broad-except
+                # Don't leave the artifacts of a previous render to be pushed
+                with self._lock:
+                    self.manifest.pop(device.name, None)
+                return err
+
+        devices = list(devices)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip([device.name for device in devices],
+                               executor.map(render_one, devices)))
+        with self._lock:
+            self._save(MANIFEST_FILE, self.manifest)
+        return results
+
+    def changed(self, device_name, name):
+        """
+        :param device_name: Device name from the testbed
+        :param name: Artifact name
+        :return: True if the rendered artifact was not pushed yet
+        """
+        with self._lock:
+            rendered = self.manifest.get(device_name, {}).get(name)
+            return rendered is not None and self.pushed.get(device_name, {}).get(name) != rendered
+
+    def mark_pushed(self, device_name, name):
+        """
+        Record that the rendered artifact was pushed to the device
+
+        :param device_name: Device name from the testbed
+        :param name: Artifact name
+        :return: None (no return)
+        """
+        with self._lock:
+            self.pushed.setdefault(device_name, {})[name] = self.manifest[device_name][name]
+            self._save(PUSHED_FILE, self.pushed)
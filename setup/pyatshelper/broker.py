@@ -0,0 +1,401 @@
+"""
+Device session broker - a local process keeping authenticated unicon
+sessions to the testbed devices open between script runs, so repeated runs
+of short scripts skip the SSH login entirely.
+
+Scripts attach to a device through the broker with attach(device).  The
+returned object forwards execute(), configure(), parse() and device.api
+calls to the broker, which runs them on its own connection to the device.
+If no broker is running, attach() simply connects to the device, so
+scripts work the same with or without a broker.
+
+Sessions unused for IDLE_TIMEOUT seconds are closed, and a session which
+was idle for HEALTH_CHECK_AFTER seconds is checked (and reconnected if
+needed) before it is used again.
+
+Start the broker from the lab directory (~/abc-en):
+    python -m pyatshelper.broker -t pyats-testbed/testbed.yml
+"""
+import os
+import pickle
+import secrets
+import threading
+import time
+from argparse import ArgumentParser
+from multiprocessing.connection import Client, Listener, AuthenticationError
+
+# Unix socket the broker listens on
+BROKER_SOCKET = os.path.expanduser(
+    os.environ.get("PYATS_BROKER_SOCKET", "~/.cache/pyats_broker.sock")
+)
+
+# File holding the key authenticating clients to the broker
+BROKER_KEY_FILE = os.path.expanduser(
+    os.environ.get("PYATS_BROKER_KEY", "~/.cache/pyats_broker.key")
+)
+
+# Seconds an unused session is kept open
+IDLE_TIMEOUT = 900
+
+# Idle seconds after which a session is checked before being used
+HEALTH_CHECK_AFTER = 60
+
+# Command used to check a session is still working
+HEALTH_CHECK_COMMAND = "show clock"
+
+# Device methods which clients may call through the broker
+BROKER_OPERATIONS = ("execute", "configure", "parse", "api")
+
+
+class DeviceSession:
+    """
+    Connection of the broker to a single device
+    """
+    def __init__(self, device):
+        self.device = device
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionBroker:
+    """
+    Holds device sessions and runs client requests on them
+    """
+    def __init__(self, testbed, address=BROKER_SOCKET, key_file=BROKER_KEY_FILE,
+                 idle_timeout=IDLE_TIMEOUT, health_check_after=HEALTH_CHECK_AFTER):
+        """
+        Class initialization
+        :param testbed:
+            pyATS testbed object defining the devices
+        :param address:
+            Unix socket to listen on
+        :param key_file:
+            File where the client authentication key is written
+        :param idle_timeout:
+            Seconds an unused session is kept open
+        :param health_check_after:
+            Idle seconds after which a session is checked before use
+        """
+        self.testbed = testbed
+        self.address = address
+        self.key_file = key_file
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.sessions = {device_name: DeviceSession(device)
+                         for device_name, device in testbed.devices.items()}
+        self.running = False
+        self._authkey = None
+
+    def _prepare_session(self, session):
+        """
+        Connect the session if needed, checking it first if it was idle
+        """
+        device = session.device
+        if device.is_connected() and time.monotonic() - session.last_used > self.health_check_after:
+            try:
+                device.execute(HEALTH_CHECK_COMMAND)
+            except Exception:  # pylint: disable=broad-except
+                print(f"Session to '{device.name}' failed its health check, reconnecting...")
+                try:
+                    device.disconnect()
+                except Exception:  # pylint: disable=broad-except
+                    pass
+        if not device.is_connected():
+            print(f"Connecting to device '{device.name}'...")
+            device.connect(log_stdout=False)
+
+    def call(self, device_name, operation, name, args, kwargs):
+        """
+        Run a device method on the broker session of the device
+
+        :param device_name: Device name from the testbed
+        :param operation: One of BROKER_OPERATIONS
+        :param name: API name if operation is "api"
+        :param args: Positional arguments of the method
+        :param kwargs: Keyword arguments of the method
+        :return: Result of the method
+        """
+        if operation not in BROKER_OPERATIONS:
+            raise ValueError(f"Operation '{operation}' not supported by the broker")
+        session = self.sessions[device_name]
+        with session.lock:
+            self._prepare_session(session)
+            if operation == "api":
+                method = getattr(session.device.api, name)
+            else:
+                method = getattr(session.device, operation)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                session.last_used = time.monotonic()
+
+    def close_idle_sessions(self):
+        """
+        Disconnect sessions unused for longer than the idle timeout
+
+        :return: None (no return)
+        """
+        for session in self.sessions.values():
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                idle = time.monotonic() - session.last_used
+                if session.device.is_connected() and idle > self.idle_timeout:
+                    print(f"Closing idle session to '{session.device.name}'")
+                    session.device.disconnect()
+            finally:
+                session.lock.release()
+
+    def _handle_client(self, connection):
+        with connection:
+            while self.running:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if request[0] == "devices":
+                    connection.send(("ok", list(self.sessions)))
+                    continue
+                if request[0] == "shutdown":
+                    self.running = False
+                    connection.send(("ok", None))
+                    self._wake_listener()
+                    return
+                try:
+                    result = self.call(*request[1:])
+                except Exception as err:  # pylint: disable=broad-except
+                    self._send_error(connection, err)
+                else:
+                    self._send_result(connection, result)
+
+    def _wake_listener(self):
+        """
+        Connect to the broker once, so accept() in serve_forever returns and
+        the loop sees the broker is no longer running.  Closing the listener
+        from another thread would not unblock accept().
+        """
+        try:
+            Client(self.address, family="AF_UNIX", authkey=self._authkey).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass
+
+    @classmethod
+    def _send_result(cls, connection, result):
+        try:
+            connection.send(("ok", result))
+        except (pickle.PicklingError, TypeError, AttributeError) as err:
+            # The result can't be sent to the client (e.g. a parser object
+            # holding the device), reply with an error instead
+            cls._send_error(connection, RuntimeError(
+                f"Result of type {type(result).__name__} can't be sent to the client: {err!r}"
+            ))
+
+    @staticmethod
+    def _send_error(connection, err):
+        try:
+            connection.send(("error", err))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Some exceptions can't be sent to the client, send their message
+            connection.send(("error", RuntimeError(f"{type(err).__name__}: {err}")))
+
+    def _reaper(self):
+        while self.running:
+            time.sleep(min(self.idle_timeout, 30))
+            self.close_idle_sessions()
+
+    def serve_forever(self):
+        """
+        Accept clients until a client requests a shutdown
+
+        :return: None (no return)
+        """
+        os.makedirs(os.path.dirname(self.key_file), exist_ok=True)
+        self._authkey = secrets.token_bytes(32)
+        with open(os.open(self.key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                  "wb") as key_file:
+            key_file.write(self._authkey)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+        self.running = True
+        threading.Thread(target=self._reaper, daemon=True).start()
+        try:
+            with Listener(self.address, family="AF_UNIX", authkey=self._authkey) as listener:
+                os.chmod(self.address, 0o600)
+                print(f"Session broker listening on {self.address}")
+                while self.running:
+                    try:
+                        connection = listener.accept()
+                    except (AuthenticationError, OSError):
+                        continue
+                    if not self.running:
+                        # Connection from _wake_listener after a shutdown
+                        connection.close()
+                        break
+                    threading.Thread(target=self._handle_client, args=(connection,),
+                                     daemon=True).start()
+        finally:
+            self.running = False
+            # Always close the device sessions, even if the listener failed
+            for session in self.sessions.values():
+                with session.lock:
+                    if session.device.is_connected():
+                        session.device.disconnect()
+
+
+def broker_connection(address=BROKER_SOCKET, key_file=BROKER_KEY_FILE):
+    """
+    Connect to the broker if one is running
+
+    :return: multiprocessing Connection object, or None if no broker is running
+    """
+    if not os.path.exists(address):
+        return None
+    try:
+        with open(key_file, "rb") as key:
+            return Client(address, family="AF_UNIX", authkey=key.read())
+    except (OSError, EOFError, AuthenticationError):
+        return None
+
+
+def broker_request(connection, *request):
+    """
+    Send a request to the broker and return its result
+
+    :param connection: Connection from broker_connection()
+    :param request: Request tuple
+    :return: Result of the request
+    :raises: Exception raised by the request on the broker
+    """
+    connection.send(request)
+    status, result = connection.recv()
+    if status == "error":
+        raise result
+    return result
+
+
+class BrokeredApi:
+    """
+    Forwards device.api calls to the broker
+    """
+    def __init__(self, brokered_device):
+        self._brokered_device = brokered_device
+
+    def __getattr__(self, name):
+        def api_call(*args, **kwargs):
+            return self._brokered_device.call("api", name, *args, **kwargs)
+        return api_call
+
+
+class BrokeredDevice:
+    """
+    Stand-in for a pyATS device whose session is held by the broker.
+    Testbed attributes (name, interfaces, custom...) come from the local
+    device object.
+    """
+    def __init__(self, device, connection):
+        self.device = device
+        self.connection = connection
+        self.api = BrokeredApi(self)
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def call(self, operation, name, *args, **kwargs):
+        """
+        Run a device method on the broker session
+
+        :return: Result of the method
+        """
+        return broker_request(self.connection, "call", self.device.name, operation, name,
+                              args, kwargs)
+
+    def execute(self, *args, **kwargs):
+        """
+        device.execute() through the broker
+        """
+        return self.call("execute", None, *args, **kwargs)
+
+    def configure(self, *args, **kwargs):
+        """
+        device.configure() through the broker
+        """
+        return self.call("configure", None, *args, **kwargs)
+
+    def parse(self, *args, **kwargs):
+        """
+        device.parse() through the broker
+        """
+        return self.call("parse", None, *args, **kwargs)
+
+    def is_connected(self):
+        """
+        The broker holds the session, connecting it when needed
+        """
+        return not self.connection.closed
+
+    def connect(self, *args, **kwargs):
+        """
+        Nothing to do - the broker holds the session
+        """
+
+    def disconnect(self):
+        """
+        Detach from the broker, which keeps the session open
+        """
+        self.connection.close()
+
+
+def attach(device, address=BROKER_SOCKET, key_file=BROKER_KEY_FILE, **connect_kwargs):
+    """
+    Use the broker session of a device if a broker is running, otherwise
+    connect to the device directly
+
+    :param device: pyATS device object
+    :param address: Unix socket of the broker
+    :param key_file: File holding the broker authentication key
+    :param connect_kwargs: Arguments of device.connect() if no broker is used
+    :return: BrokeredDevice object, or the connected device object
+    """
+    if connection := broker_connection(address, key_file):
+        try:
+            if device.name in broker_request(connection, "devices"):
+                return BrokeredDevice(device, connection)
+        except (OSError, EOFError):
+            pass
+        connection.close()
+    device.connect(**connect_kwargs)
+    return device
+
+
+if __name__ == "__main__":
+    # pylint: disable-next=import-outside-toplevel
+    from pyats.topology import loader
+
+    parser = ArgumentParser()
+    parser.add_argument("-t",
+                        dest="testbed_file",
+                        action="store",
+                        help="pyATS testbed file defining the devices",
+                        default="~/abc-en/pyats-testbed/testbed.yml")
+    parser.add_argument("-i",
+                        dest="idle_timeout",
+                        action="store",
+                        type=float,
+                        help="Seconds an unused session is kept open",
+                        default=IDLE_TIMEOUT)
+    parser.add_argument("-s",
+                        dest="shutdown",
+                        action="store_true",
+                        help="Stop the running broker")
+    args = parser.parse_args()
+
+    if args.shutdown:
+        if broker := broker_connection():
+            broker_request(broker, "shutdown")
+            print("Session broker stopped.")
+        else:
+            print("No session broker running.")
+    else:
+        SessionBroker(loader.load(os.path.expanduser(args.testbed_file)),
+                      idle_timeout=args.idle_timeout).serve_forever()
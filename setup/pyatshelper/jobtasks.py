@@ -0,0 +1,112 @@
+"""
+Per-device Easypy tasks - runs a testscript as several Easypy tasks, each
+testing one device (or a shard of devices), with a limited number of tasks
+running at the same time.  Easypy merges the results of every task in the
+job report, so the job wall time stays about the same as the fleet grows.
+
+The testscript receives the device names of its task as the "devices"
+script parameter, and should only test those devices (all devices when
+the parameter is None).
+
+Job file example:
+    args = task_arguments()
+    if args.device_tasks:
+        run_device_tasks(testscript, runtime, args.shard_size, args.max_workers)
+    else:
+        run(testscript=testscript, runtime=runtime)
+
+    pyats run job ntp_job.py --testbed-file testbed.yml --device-tasks --max-workers 8
+"""
+import os
+import time
+from argparse import ArgumentParser
+
+# Number of devices tested by each task
+TASK_SHARD_SIZE = 1
+
+# Number of tasks running at the same time
+TASK_MAX_WORKERS = 4
+
+# Seconds between checks of the running tasks
+TASK_POLL_INTERVAL = 1
+
+
+def task_arguments():
+    """
+    Parse the job arguments selecting per-device tasks.  Other arguments are
+    left to Easypy.
+
+    :return: argparse Namespace with device_tasks, shard_size and max_workers
+    """
+    parser = ArgumentParser()
+    parser.add_argument("--device-tasks",
+                        dest="device_tasks",
+                        action="store_true",
+                        help="Run one task per device (or per shard of devices)")
+    parser.add_argument("--shard-size",
+                        dest="shard_size",
+                        action="store",
+                        type=int,
+                        help="Number of devices tested by each task",
+                        default=TASK_SHARD_SIZE)
+    parser.add_argument("--max-workers",
+                        dest="max_workers",
+                        action="store",
+                        type=int,
+                        help="Number of tasks running at the same time",
+                        default=TASK_MAX_WORKERS)
+    args, _ = parser.parse_known_args()
+    return args
+
+
+def shard_devices(device_names, shard_size):
+    """
+    Split device names into shards
+
+    :param device_names: List of device names
+    :param shard_size: Number of devices per shard
+    :return: List of lists of device names
+    """
+    shard_size = max(shard_size, 1)
+    return [device_names[index:index + shard_size]
+            for index in range(0, len(device_names), shard_size)]
+
+
+def run_device_tasks(testscript, runtime, shard_size=TASK_SHARD_SIZE,
+                     max_workers=TASK_MAX_WORKERS, **script_args):
+    """
+    Run a testscript as one Easypy task per shard of devices of the testbed
+
+    :param testscript: Path of the testscript
+    :param runtime: Easypy runtime object
+    :param shard_size: Number of devices tested by each task
+    :param max_workers: Number of tasks running at the same time
+    :param script_args: Other script parameters passed to every task
+    :return: List of the task results
+    """
+    # pylint: disable-next=import-outside-toplevel,no-name-in-module
+    from pyats.easypy import Task
+
+    script_name = os.path.splitext(os.path.basename(testscript))[0]
+    pending = shard_devices(list(runtime.testbed.devices), shard_size)
+    running = []
+    tasks = []
+    while pending or running:
+        # Start tasks until max_workers are running
+        while pending and len(running) < max(max_workers, 1):
+            shard = pending.pop(0)
+            task_id = f"{script_name}_{shard[0]}" if shard_size <= 1 \
+                else f"{script_name}_shard{len(tasks) + 1}"
+            task = Task(testscript=testscript, runtime=runtime, taskid=task_id,
+                        devices=shard, **script_args)
+            task.start()
+            running.append(task)
+            tasks.append(task)
+
+        time.sleep(TASK_POLL_INTERVAL)
+        for task in [task for task in running if not task.is_alive()]:
+            # wait() collects the result of the finished task
+            task.wait()
+            running.remove(task)
+
+    return [task.result for task in tasks]
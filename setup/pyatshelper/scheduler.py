@@ -0,0 +1,203 @@
+"""
+Device scheduler - runs per-device work on several devices at a time, with a
+concurrency limit adapting to how the devices (and the host running the
+script) cope with the load.
+
+The limit follows AIMD (additive increase, multiplicative decrease):
+- Each successful device call under the latency target raises the limit by
+  1/limit, so the limit grows by about one device per round of calls
+- A call failing with an overload error (by default any exception), or a
+  call slower than the latency target, multiplies the limit by
+  DECREASE_FACTOR.  Calls started before the last decrease don't
+  decrease it again, so a burst of slow calls only halves the limit once.
+
+Devices waiting for a slot start in priority order - devices of groups with
+a lower priority number first, then in the order given.  The group of a
+device is the "scheduler_group" value of its testbed custom data.
+
+Example:
+    scheduler = DeviceScheduler(max_limit=10)
+    results = scheduler.run(testbed.devices.values(), configure_device)
+
+Device calls made inside the work function can be measured individually
+with "with scheduler.measure():".  Otherwise the duration of the whole
+work function is used.
+
+Only errors showing the device (or the host) can't keep up should reduce the
+limit - pass the connection and timeout exceptions of the scripts as
+overload_errors, so a rejected command doesn't halve the limit:
+    scheduler = DeviceScheduler(overload_errors=(ConnectionError, TimeoutError))
+"""
+import heapq
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# Number of devices worked on at the same time when starting
+INITIAL_LIMIT = 2
+
+# Highest number of devices worked on at the same time
+MAX_LIMIT = 10
+
+# Seconds a device call may take before the limit is decreased
+LATENCY_TARGET = 30
+
+# Factor applied to the limit when a call fails or is too slow
+DECREASE_FACTOR = 0.5
+
+# Priority of the device groups, lower priorities run first
+GROUP_PRIORITIES = {"core": 0, "distribution": 1, "access": 2}
+
+# Priority of devices whose group has no priority
+DEFAULT_PRIORITY = 100
+
+# Testbed custom data key holding the group of a device
+GROUP_KEY = "scheduler_group"
+
+
+def device_group(device):
+    """
+    :param device: pyATS device object
+    :return: Group of the device from its testbed custom data, or None
+    """
+    return device.custom.get(GROUP_KEY)
+
+
+class DeviceScheduler:
+    """
+    Runs a function for each device, with an AIMD concurrency limit
+    """
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, initial_limit=INITIAL_LIMIT, max_limit=MAX_LIMIT, min_limit=1,
+                 latency_target=LATENCY_TARGET, priorities=None, overload_errors=(Exception,)):
+        """
+        Class initialization
+        :param initial_limit:
+            Number of devices worked on at the same time when starting
+        :param max_limit:
+            Highest number of devices worked on at the same time
+        :param min_limit:
+            Lowest number of devices worked on at the same time
+        :param latency_target:
+            Seconds a device call may take before the limit is decreased
+        :param priorities:
+            Dict of device group to priority, lower priorities run first.
+            Defaults to GROUP_PRIORITIES.
+        :param overload_errors:
+            Exception types which decrease the limit, other exceptions don't
+            change it
+        """
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.priorities = GROUP_PRIORITIES if priorities is None else priorities
+        self.overload_errors = tuple(overload_errors)
+        self.active = 0
+        self.peak = 0
+        self.decreases = 0
+        self._condition = threading.Condition()
+        self._last_decrease = perf_counter()
+        self._local = threading.local()
+
+    def priority(self, device):
+        """
+        :param device: pyATS device object
+        :return: Priority of the device group, lower priorities run first
+        """
+        return self.priorities.get(device_group(device), DEFAULT_PRIORITY)
+
+    def record(self, started, latency, error=False):
+        """
+        Adjust the limit after a device call
+
+        :param started: perf_counter() value when the call started
+        :param latency: Seconds the call took
+        :param error: True if the call failed
+        :return: None (no return)
+        """
+        with self._condition:
+            if error or latency > self.latency_target:
+                # Calls started before the last decrease ran under the old
+                # limit, they don't decrease it again
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = perf_counter()
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def measure(self):
+        """
+        Context manager measuring a device call to adjust the limit.  An
+        overload error raised inside the block counts as an error, other
+        exceptions are not recorded.
+        """
+        self._local.measured = True
+        started = perf_counter()
+        try:
+            yield
+        except self.overload_errors:
+            self.record(started, perf_counter() - started, error=True)
+            raise
+        self.record(started, perf_counter() - started)
+
+    def _work(self, pending, operation, failed, results):
+        """
+        Worker thread - runs the operation on pending devices while there
+        are some left
+        """
+        while True:
+            with self._condition:
+                while pending and self.active >= int(self.limit):
+                    self._condition.wait()
+                if not pending:
+                    return
+                _, index, device = heapq.heappop(pending)
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+
+            self._local.measured = False
+            started = perf_counter()
+            error = False
+            try:
+                results[index] = operation(device)
+                error = failed is not None and failed(results[index])
+            except Exception as err:  # pylint: disable=broad-except
+                results[index] = err
+                error = isinstance(err, self.overload_errors)
+            finally:
+                # Failures always count, even if the device calls were
+                # measured and succeeded
+                if error or not self._local.measured:
+                    self.record(started, perf_counter() - started, error)
+                with self._condition:
+                    self.active -= 1
+                    self._condition.notify_all()
+
+    def run(self, devices, operation, failed=None):
+        """
+        Run a function for each device, several devices at a time
+
+        :param devices: Iterable of pyATS device objects
+        :param operation: Function called with each device
+        :param failed: Optional function called with the result of the
+            operation, returning True if the result is a failure
+        :return: List of the operation results in device order.  If the
+            operation raised an exception for a device, the exception is
+            the result of the device.
+        """
+        devices = list(devices)
+        pending = [(self.priority(device), index, device) for index, device in enumerate(devices)]
+        heapq.heapify(pending)
+        results = [None] * len(devices)
+        workers = [threading.Thread(target=self._work, args=(pending, operation, failed, results),
+                                    daemon=True)
+                   for _ in range(min(self.max_limit, len(devices)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
@@ -0,0 +1,204 @@
+"""
+Snapshot store for show command output - raw and parsed output of each
+device is saved under the snapshots directory with a timestamp and checksum,
+so test scripts can reuse a recent snapshot instead of collecting the same
+output from the device again.
+
+Snapshots are saved as:
+    <snapshot_dir>/<device>_snapshot/<command>.json
+
+Reuse is opt-in: snapshots are always saved, but only reused when a maximum
+age is given (or set with the PYATS_SNAPSHOT_MAX_AGE environment variable),
+since a configuration script may have changed the device in the meantime.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+# Directory holding the device snapshot directories
+DEFAULT_SNAPSHOT_DIR = os.environ.get("PYATS_SNAPSHOT_DIR", "~/abc-en/snapshots")
+
+# Seconds a snapshot may be reused by default - 0 to always collect
+SNAPSHOT_MAX_AGE = float(os.environ.get("PYATS_SNAPSHOT_MAX_AGE", 0))
+
+
+def checksum(content):
+    """
+    :param content: Raw command output
+    :return: SHA-256 checksum of the output
+    """
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def config_section(config_text, section):
+    """
+    Get the lines configured under a section of a running configuration,
+    e.g. the lines of "interface Loopback0"
+
+    :param config_text: Running configuration text
+    :param section: Section line, e.g. "interface Loopback0"
+    :return: List of the child lines (stripped), empty if no such section
+    """
+    lines = []
+    in_section = False
+    for line in config_text.splitlines():
+        if not line.startswith(" "):
+            if in_section:
+                break
+            in_section = line.strip() == section
+        elif in_section:
+            lines.append(line.strip())
+    return lines
+
+
+class SnapshotStore:
+    """
+    Saves and reuses show command output per device
+    """
+    def __init__(self, snapshot_dir=DEFAULT_SNAPSHOT_DIR, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Class initialization
+        :param snapshot_dir:
+            Directory holding the device snapshot directories
+        :param max_age:
+            Seconds a snapshot may be reused, 0 to always collect
+        """
+        self.snapshot_dir = os.path.expanduser(snapshot_dir)
+        self.max_age = max_age
+
+    def path(self, device_name, command):
+        """
+        :param device_name: Device name from the testbed
+        :param command: Show command
+        :return: Path of the snapshot file
+        """
+        file_name = re.sub(r"[^\w.-]+", "_", command.strip()) + ".json"
+        return os.path.join(self.snapshot_dir, f"{device_name}_snapshot", file_name)
+
+    def save(self, device_name, command, raw, parsed=None):
+        """
+        Save the output of a command
+
+        :param device_name: Device name from the testbed
+        :param command: Show command
+        :param raw: Raw command output
+        :param parsed: (Optional) Parsed command output
+        :return: Dict - the saved snapshot
+        """
+        snapshot = {
+            "device": device_name,
+            "command": command,
+            "timestamp": time.time(),
+            "checksum": checksum(raw),
+            "raw": raw,
+            "parsed": parsed,
+        }
+        path = self.path(device_name, command)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see partial content
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False,
+                                         encoding="utf-8") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(snapshot_file.name, path)
+        return snapshot
+
+    def load(self, device_name, command, max_age=None):
+        """
+        Load a snapshot if it is recent enough and intact
+
+        :param device_name: Device name from the testbed
+        :param command: Show command
+        :param max_age: (Optional) Maximum age in seconds, default of the store otherwise
+        :return: Dict - the snapshot, or None if there is no usable snapshot
+        """
+        max_age = self.max_age if max_age is None else max_age
+        if max_age <= 0:
+            return None
+        try:
+            with open(self.path(device_name, command), "r", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - snapshot.get("timestamp", 0) > max_age:
+            return None
+        if snapshot.get("checksum") != checksum(snapshot.get("raw", "")):
+            return None
+        return snapshot
+
+    def invalidate(self, device_name, command=None):
+        """
+        Remove the snapshot of a command, or every snapshot of the device
+
+        :param device_name: Device name from the testbed
+        :param command: (Optional) Show command
+        :return: None (no return)
+        """
+        if command:
+            paths = [self.path(device_name, command)]
+        else:
+            device_dir = os.path.join(self.snapshot_dir, f"{device_name}_snapshot")
+            paths = ([os.path.join(device_dir, name) for name in os.listdir(device_dir)]
+                     if os.path.isdir(device_dir) else [])
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _connect(device, connect=None):
+        if connect is not None:
+            return connect(device)
+        if not device.is_connected():
+            device.connect(log_stdout=False)
+        return device
+
+    def execute(self, device, command, max_age=None, connect=None):
+        """
+        Raw output of a command - from a recent snapshot if available,
+        otherwise executed on the device (connecting if needed) and saved.
+        The snapshot is only loaded once, so it can't expire between the
+        check and its use.
+
+        :param device: pyATS device object
+        :param command: Show command
+        :param max_age: (Optional) Maximum snapshot age in seconds
+        :param connect: (Optional) Function called with the device when the
+            output must be collected, returning the connected device object
+            to use, e.g. attach.  The device is connected directly otherwise.
+        :return: Raw command output
+        """
+        if snapshot := self.load(device.name, command, max_age):
+            return snapshot["raw"]
+        raw = self._connect(device, connect).execute(command)
+        self.save(device.name, command, raw)
+        return raw
+
+    def parse(self, device, command, max_age=None, connect=None):
+        """
+        Parsed output of a command - from a recent snapshot if available,
+        otherwise executed on the device (connecting if needed), parsed and
+        saved
+
+        :param device: pyATS device object
+        :param command: Show command with a Genie parser
+        :param max_age: (Optional) Maximum snapshot age in seconds
+        :param connect: (Optional) Function called with the device when the
+            output must be collected, like in execute()
+        :return: Parsed command output
+        """
+        device_name = device.name
+        snapshot = self.load(device_name, command, max_age)
+        if snapshot and snapshot["parsed"] is not None:
+            return snapshot["parsed"]
+        if snapshot:
+            raw = snapshot["raw"]
+        else:
+            device = self._connect(device, connect)
+            raw = device.execute(command)
+        parsed = device.parse(command, output=raw)
+        self.save(device_name, command, raw, parsed)
+        return parsed
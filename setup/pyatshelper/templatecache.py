@@ -0,0 +1,90 @@
+"""
+Shared Jinja2 template environments, replacing the get_jinja_template and
+load_jinja_template Genie APIs in scripts rendering templates for many
+devices.
+
+The Genie APIs create a new Jinja2 environment on each call, so the
+template is read and compiled again for every device.  Here one
+environment is kept per template directory:
+- Compiled templates are kept in memory, and only compiled again if the
+  template file changes
+- The compiled code is also saved under ~/.cache/pyats_templates, so the
+  next runs skip compiling templates which did not change.  Set the
+  PYATS_TEMPLATE_CACHE environment variable to use another directory.
+
+Example:
+    template = get_jinja_template(templates_dir="templates",
+                                  template_name="ntp_template.j2")
+    config = template.render(ntp_servers=...)
+"""
+import os
+import threading
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, StrictUndefined
+from jinja2.exceptions import TemplateNotFound
+
+# Directory where compiled templates are saved between runs
+TEMPLATE_CACHE_DIR = os.path.expanduser(
+    os.environ.get("PYATS_TEMPLATE_CACHE", "~/.cache/pyats_templates")
+)
+
+# Number of compiled templates kept in memory per template directory
+TEMPLATE_CACHE_SIZE = 400
+
+_environments = {}
+_environments_lock = threading.Lock()
+
+
+def get_environment(templates_dir, cache_dir=TEMPLATE_CACHE_DIR):
+    """
+    Jinja2 environment of a template directory, created on first use
+
+    :param templates_dir: Directory holding the templates
+    :param cache_dir: Directory where compiled templates are saved, or None
+        to only keep them in memory
+    :return: jinja2.Environment object
+    """
+    templates_dir = os.path.abspath(os.path.expanduser(templates_dir))
+    with _environments_lock:
+        if templates_dir not in _environments:
+            bytecode_cache = None
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(cache_dir)
+            # Same undefined behavior as the Genie template APIs.  With
+            # auto_reload, the template file modification time is checked
+            # before a compiled template is reused.
+            _environments[templates_dir] = Environment(
+                loader=FileSystemLoader(templates_dir),
+                undefined=StrictUndefined,
+                bytecode_cache=bytecode_cache,
+                cache_size=TEMPLATE_CACHE_SIZE,
+                auto_reload=True,
+            )
+        return _environments[templates_dir]
+
+
+def get_jinja_template(templates_dir, template_name):
+    """
+    Compiled template, like the get_jinja_template Genie API
+
+    :param templates_dir: Directory holding the templates
+    :param template_name: Template file name
+    :return: jinja2.Template object, or None if the template does not exist
+    """
+    try:
+        return get_environment(templates_dir).get_template(template_name)
+    except TemplateNotFound:
+        return None
+
+
+def load_jinja_template(path, file, **kwargs):
+    """
+    Render a template, like the load_jinja_template Genie API
+
+    :param path: Directory holding the templates
+    :param file: Template file name
+    :param kwargs: Variables passed to the template
+    :return: Rendered template string
+    :raises: jinja2.exceptions.TemplateNotFound if the template does not exist
+    """
+    return get_environment(path).get_template(file).render(**kwargs)
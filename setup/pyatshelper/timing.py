@@ -0,0 +1,164 @@
+"""
+Per-device phase timing - records how long each device spends in each phase
+of a script (connect, configure, parse, save, disconnect...) and reports the
+results per device, with percentiles across the fleet, as JSON or CSV.
+
+Example:
+    timer = PhaseTimer()
+    with timer.phase(device.name, "connect"):
+        device.connect()
+    ...
+    timer.write("timing.json")
+"""
+import csv
+import io
+import json
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# Percentiles reported across the fleet
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    """
+    Percentile of a list of values, interpolating between the closest ranks
+
+    :param values: List of numbers
+    :param percent: Percentile, e.g. 90
+    :return: Value of the percentile, 0 if there are no values
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class PhaseTimer:
+    """
+    Thread-safe collection of the time spent per device and per phase
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.devices = {}
+        self.phases = []
+        # Phases running in the current thread, to exclude nested phases
+        self._local = threading.local()
+
+    def record(self, device_name, phase_name, seconds):
+        """
+        Add time spent by a device in a phase
+
+        :param device_name: Device name
+        :param phase_name: Phase name, e.g. "connect"
+        :param seconds: Time spent in seconds
+        :return: None (no return)
+        """
+        with self._lock:
+            if phase_name not in self.phases:
+                self.phases.append(phase_name)
+            device_phases = self.devices.setdefault(device_name, {})
+            device_phases[phase_name] = device_phases.get(phase_name, 0) + seconds
+
+    @contextmanager
+    def phase(self, device_name, phase_name):
+        """
+        Context manager timing the enclosed block, even if it raises.  The
+        time of phases nested in the block (e.g. a connection opened while
+        collecting output) is only counted in the nested phase.
+
+        :param device_name: Device name
+        :param phase_name: Phase name, e.g. "connect"
+        """
+        running = self._local.__dict__.setdefault("running", [])
+        # Time spent in nested phases, as a one-item list updated by them
+        nested_time = [0.0]
+        running.append(nested_time)
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start_time
+            running.pop()
+            if running:
+                running[-1][0] += elapsed
+            self.record(device_name, phase_name, elapsed - nested_time[0])
+
+    def summary(self):
+        """
+        :return: Dict of phase name (and "total") to a dict of percentile
+            name ("p50", "p90"...) and "max" to seconds across the devices
+        """
+        with self._lock:
+            columns = self.phases + ["total"]
+            values = {phase_name: [] for phase_name in columns}
+            for device_phases in self.devices.values():
+                for phase_name in self.phases:
+                    if phase_name in device_phases:
+                        values[phase_name].append(device_phases[phase_name])
+                values["total"].append(sum(device_phases.values()))
+        return {phase_name: {**{f"p{percent}": round(percentile(phase_values, percent), 3)
+                                for percent in PERCENTILES},
+                             "max": round(max(phase_values, default=0), 3)}
+                for phase_name, phase_values in values.items()}
+
+    def to_dict(self):
+        """
+        :return: Dict with the time per device and phase, and the summary
+        """
+        with self._lock:
+            devices = {device_name: {**{phase_name: round(seconds, 3)
+                                        for phase_name, seconds in device_phases.items()},
+                                     "total": round(sum(device_phases.values()), 3)}
+                       for device_name, device_phases in self.devices.items()}
+        return {"devices": devices, "summary": self.summary()}
+
+    def to_json(self):
+        """
+        :return: Timing report as a JSON string
+        """
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_csv(self):
+        """
+        :return: Timing report as CSV - one row per device, then one row per
+            percentile across the devices
+        """
+        report = self.to_dict()
+        columns = self.phases + ["total"]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["device"] + columns)
+        for device_name, device_phases in report["devices"].items():
+            writer.writerow([device_name] + [device_phases.get(column, "") for column in columns])
+        for statistic in [f"p{percent}" for percent in PERCENTILES] + ["max"]:
+            writer.writerow([statistic] + [report["summary"][column][statistic]
+                                           for column in columns])
+        return output.getvalue()
+
+    def print_summary(self):
+        """
+        Print the percentiles of each phase across the devices
+
+        :return: None (no return)
+        """
+        statistics = [f"p{percent}" for percent in PERCENTILES] + ["max"]
+        print(f"{'Phase':<20}" + "".join(f"{statistic:>10}" for statistic in statistics))
+        for phase_name, phase_summary in self.summary().items():
+            print(f"{phase_name:<20}" + "".join(f"{phase_summary[statistic]:9.2f}s"
+                                                for statistic in statistics))
+
+    def write(self, path):
+        """
+        Write the timing report to a file - JSON if the file name ends with
+        ".json", otherwise CSV.
+
+        :param path: Output file path
+        :return: None (no return)
+        """
+        with open(path, "w", encoding="utf-8", newline="") as timing_file:
+            timing_file.write(self.to_json() if path.endswith(".json") else self.to_csv())
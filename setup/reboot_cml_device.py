@@ -1,16 +1,15 @@
 """
-Simple script to locate CML topology with title including "clus" and call the
-lab start API.
+Simple script to locate nodes of the CML topology with title including
+"ltrcrt-2157" and restart them.
 
 Error checking is minimal - rapid prototype for lab use
 """
 from sys import exit as sysexit
-from time import sleep
-import requests
+from argparse import ArgumentParser
 from urllib3 import disable_warnings
-from cml_creds import CML_HOST, auth_payload
-from apihelper import http_exceptions, init_http_session, BearerAuth, close_http_session
-from argparse import (ArgumentParser)
+from cml_creds import CML_BASE_URL, auth_payload
+from apihelper import (CMLClient, RequestMetrics, print_fleet_summary, FLEET_CONCURRENCY,
+                       RESTART_TIMEOUT, READINESS_PORTS, title_pattern)
 
 
 # Global TLS verification - False if using self-signed certificates
@@ -21,183 +20,140 @@ if not TLS_VERIFY:
     disable_warnings()
 
 # Base URL for the HTTP session
-BASE_URL = f"https://{CML_HOST}"
-
-# Generic application/json headers
-HTTP_HEADERS = {
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
-
-# Authenticate, get a token, and create an HTTP session.  Retry until
-# MAX_RETRIES is hit, otherwise exit the script
-CML_TOKEN = None
-MAX_RETRIES = 5
-RETRY = 1
-
-while not CML_TOKEN:
-    if RETRY == MAX_RETRIES:
-        sysexit("Maximum retry limit reached, unable to connect to CML. "
-                "Check settings and CML host reachability.")
-    else:
-        try:
-            print(f"Attempting to authenticate to CML at {BASE_URL} (attempt #{RETRY})...")
-            cml_auth_url = f"{BASE_URL}/api/v0/authenticate"
-            auth_response = requests.post(url=cml_auth_url,
-                                          json=auth_payload,
-                                          headers=HTTP_HEADERS,
-                                          verify=TLS_VERIFY,
-                                          timeout=5)
-            CML_TOKEN = auth_response.json()
-        # pylint: disable-next=broad-except
-        except Exception as err:  # Catch any exception, not worried about specifics
-            print(f"Exception encountered during authentication.  Details:\n{err}")
-            RETRY += 1
-        else:
-            # Use init_http_session from apihelper to start a BaseUrlSession
-            # with bearer token auth, TLS validation disabled, and generic
-            # application/json headers
-            print("Authentication success!  Initializing the HTTP session...")
-            http_session = init_http_session(baseurl=BASE_URL, auth=BearerAuth(token=CML_TOKEN))
-            http_session.verify = TLS_VERIFY
-            http_session.headers.update(
-                {
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-            )
-
-
-@http_exceptions
-def get_cml_labs():
-    """
-    Get all labs from the CML instance.
-
-    :return: JSON response containing a list of lab IDs
-    """
-    url = "/api/v0/labs"
-    print("Retrieving available labs from CML...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
-
-
-@http_exceptions
-def get_cml_lab_details(lab_id):
-    """
-    Get the details of a specific lab
-
-    :param lab_id: ID of the lab to retrieve
-    :return: JSON response containing the lab details
-    """
-    url = f"/api/v0/labs/{lab_id}"
-    print(f"Retrieving details for lab with ID '{lab_id}' from CML...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
-
-
-@http_exceptions
-def get_cml_lab_nodes(lab_id):
-    """
-    Get all nodes from a CML lab.
-
-    :return: JSON response containing a list of node IDs
-    """
-    url = f"/api/v0/labs/{lab_id}/nodes"
-    print(f"Retrieving all nodes from from with ID '{lab_id}'...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
-
-
-@http_exceptions
-def get_cml_node_details(lab_id, node_id):
-    """
-    Get details for a specific CML node.
-
-    :return: JSON response containing node details
-    """
-    url = f"/api/v0/labs/{lab_id}/nodes/{node_id}"
-    # print(f"Retrieving node details for device...")
-    lab_response = http_session.get(url=url)
-    return lab_response.json()
-
-
-@http_exceptions
-def restart_cml_node(lab_id, node_id):
-    """
-    Restart a CML node.
-
-    :return: Boolean indicating success (True) or failure (False)
-    """
-    restart_result = False
-
-    state_url = f"/api/v0/labs/{lab_id}/nodes/{node_id}/state"
-    stop_url = f"{state_url}/stop"
-    start_url = f"{state_url}/start"
-    print(f"Stopping node...")
-    lab_response = http_session.put(url=stop_url)
-    if lab_response.ok:
-        while stop_result := http_session.get(url=state_url):
-            if stop_result.json()["state"] == "STOPPED":
-                break
-            else:
-                sleep(5)
-
-        print(f"Starting node...")
-        start_response = http_session.put(url=start_url)
-        if start_response.ok:
-            while stop_result := http_session.get(url=state_url):
-                if stop_result.json()["state"] == "STARTED":
-                    restart_result = True
-                    break
-                else:
-                    sleep(5)
+BASE_URL = CML_BASE_URL
 
-    return restart_result
+# Title (or regular expression) of the lab to locate
+LAB_TITLE = "ltrcrt-2157"
 
+# pyATS testbed defining the management address of each device
+TESTBED = "~/abc-en/pyats-testbed/testbed.yml"
 
-@http_exceptions
-def start_cml_lab(lab_id):
-    """
-    Send a start request for the specified lab
+# Latency, retry and status code metrics of every CML API request
+request_metrics = RequestMetrics()
 
-    :param lab_id: ID of the lab to start
-    :return: HTTP response of the start request
-    """
-    url = f"/api/v0/labs/{lab_id}/start"
-    print(f"Starting CML topology with ID '{lab_id}'...")
-    lab_response = http_session.put(url=url)
-    return lab_response
+# CML client with bearer token auth, TLS validation disabled, and generic
+# application/json headers.  No connection is made until the first request.
+cml_client = CMLClient(BASE_URL, auth_payload, verify=TLS_VERIFY, metrics=request_metrics)
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
-    parser.add_argument("-n",
-                        dest="node_name",
+    node_selection = parser.add_mutually_exclusive_group(required=True)
+    node_selection.add_argument("-n",
+                                dest="node_names",
+                                action="store",
+                                nargs="+",
+                                help="Name(s) of node(s) to restart")
+    node_selection.add_argument("-a",
+                                dest="all_nodes",
+                                action="store_true",
+                                help="Restart all nodes in the lab")
+    parser.add_argument("-l",
+                        dest="lab_titles",
+                        action="store",
+                        nargs="+",
+                        type=title_pattern,
+                        help="Title(s) (or regular expressions) of the lab(s) to restart nodes in",
+                        default=[LAB_TITLE])
+    parser.add_argument("-f",
+                        dest="fleet",
+                        action="store_true",
+                        help="Fleet mode - restart nodes in every matching lab, not only the first")
+    parser.add_argument("-c",
+                        dest="concurrency",
+                        action="store",
+                        type=int,
+                        help="Maximum number of labs handled concurrently in fleet mode",
+                        default=FLEET_CONCURRENCY)
+    parser.add_argument("-t",
+                        dest="timeout",
+                        action="store",
+                        type=float,
+                        help="Seconds allowed for the nodes to stop and start again",
+                        default=RESTART_TIMEOUT)
+    parser.add_argument("-w",
+                        dest="wait",
+                        action="store_true",
+                        help="Wait until the devices are reachable before exiting")
+    parser.add_argument("-b",
+                        dest="testbed_file",
+                        action="store",
+                        help="pyATS testbed defining the management address of each device",
+                        default=TESTBED)
+    parser.add_argument("-p",
+                        dest="ports",
+                        action="store",
+                        nargs="+",
+                        type=int,
+                        help="TCP ports which must accept connections with -w",
+                        default=list(READINESS_PORTS))
+    parser.add_argument("-m",
+                        dest="metrics_file",
                         action="store",
-                        help="Name of node to restart",
-                        required=True)
+                        help="Write request metrics to this file (JSON if named *.json, "
+                             "otherwise Prometheus text format)")
     args = parser.parse_known_args()[0]
 
-    cml_labs = get_cml_labs()
-    print(f"Got labs: {cml_labs}")
-
-    try:
-        for lab in cml_labs:
-            lab_details = get_cml_lab_details(lab)
-            if "ltrcrt-2157" in lab_details.get("lab_title").lower():
-                lab_nodes = get_cml_lab_nodes(lab)
-                for node in lab_nodes:
-                    node_details = get_cml_node_details(lab, node)
-                    if args.node_name.lower() == node_details["data"]["label"].lower():
-                        print("Node ID located, restarting device...")
-                        restart_response = restart_cml_node(lab, node)
-                        if restart_response:
-                            print("\n*** Node restarted. Please wait 3-5 minutes for bootup ***\n")
-                        else:
-                            print("\n***Problem restarting the node. Please ask your proctor for assistance! ***\n")
-
-                break
-    except TypeError:
-        print("No labs retrieved from CML, check settings and re-try.")
-
-    close_http_session(http_session)
+    # Authenticate (reusing a cached token when still valid).  Exit the
+    # script if CML can't be reached.
+    if not cml_client.connect():
+        sysexit("Maximum retry limit reached, unable to connect to CML. "
+                "Check settings and CML host reachability.")
+
+    # Set to False by any failure, so the exit code can gate a pipeline
+    restart_ok = True
+    labs = cml_client.find_labs(args.lab_titles)
+    if labs and args.fleet:
+        print(f"Restarting nodes in {len(labs)} lab(s), {args.concurrency} at a time...")
+        fleet_results = cml_client.restart_labs(labs, node_labels=args.node_names,
+                                                wait=args.wait, timeout=args.timeout,
+                                                max_concurrency=args.concurrency)
+        restart_ok = bool(fleet_results) and print_fleet_summary(fleet_results)
+    elif labs:
+        lab = labs[0][0]
+        if args.all_nodes:
+            lab_nodes = cml_client.find_all_nodes(lab) or {}
+        else:
+            lab_nodes = {}
+            for node_name in args.node_names:
+                if node := cml_client.find_node(lab, node_name):
+                    lab_nodes[node_name] = node
+                else:
+                    print(f"No node labeled '{node_name}' found in the lab.")
+                    restart_ok = False
+
+        if lab_nodes:
+            print("Node ID(s) located, restarting device(s)...")
+            restart_response = cml_client.restart_nodes(lab, lab_nodes.values(),
+                                                        timeout=args.timeout)
+            for node_name, node in lab_nodes.items():
+                restarted, elapsed = (restart_response or {}).get(node, (False, 0))
+                print(f"{node_name:<20} {'OK' if restarted else 'FAIL':<6} {elapsed:7.1f}s")
+
+            if not (restart_response and all(result for result, _ in restart_response.values())):
+                print("\n***Problem restarting the node(s). "
+                      "Please ask your proctor for assistance! ***\n")
+                restart_ok = False
+            elif not args.wait:
+                print("\n*** Node(s) restarted. Please wait 3-5 minutes for bootup ***\n")
+            elif cml_client.wait_for_devices(lab, args.testbed_file, lab_nodes.keys(),
+                                             ports=args.ports):
+                print("\n*** Node(s) restarted and reachable ***\n")
+            else:
+                print("\n***Node(s) not reachable after restart. "
+                      "Please ask your proctor for assistance! ***\n")
+                restart_ok = False
+        else:
+            print("No node to restart found in the lab.")
+            restart_ok = False
+    else:
+        print("No matching lab retrieved from CML, check settings and re-try.")
+        restart_ok = False
+
+    cml_client.close()
+
+    if args.metrics_file:
+        request_metrics.write(args.metrics_file)
+
+    if not restart_ok:
+        sysexit("Problem restarting the node(s), check the messages above.")